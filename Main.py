@@ -1,6 +1,11 @@
 import streamlit as st
 
+from fairmont.queries import query_stats_frame
+
 st.set_page_config(layout="wide")
 st.title("Fairmont Data Analytics")
 st.info("Select one of the charts from the sidebar")
 
+# How often each query was served from the caches, by fingerprint
+with st.expander("Query cache statistics"):
+    st.dataframe(query_stats_frame(), use_container_width=True, hide_index=True)
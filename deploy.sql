@@ -8,6 +8,7 @@ create or replace stage mgm_streamlit_stage;
 
 PUT file:///Users/nitshawacinski/Desktop/mgm-streamlit-snowflake/Main.py @mgm_streamlit_stage overwrite=true auto_compress=false;
 PUT file:///Users/nitshawacinski/Desktop/mgm-streamlit-snowflake/pages/*.py @mgm_streamlit_stage/pages overwrite=true auto_compress=false;
+PUT file:///Users/nitshawacinski/Desktop/mgm-streamlit-snowflake/fairmont/*.py @mgm_streamlit_stage/fairmont overwrite=true auto_compress=false;
 
 CREATE OR REPLACE STREAMLIT mgm_analytics
     ROOT_LOCATION = '@SALES_ANALYTICS.public.mgm_streamlit_stage'
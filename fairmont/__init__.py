@@ -0,0 +1 @@
+# Shared helpers for the Fairmont Streamlit pages
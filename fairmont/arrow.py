@@ -0,0 +1,40 @@
+import logging
+
+import pandas as pd
+from streamlit.logger import get_logger
+
+from fairmont.config import get_option
+
+# Arrow-backed frames end to end (the arrow_dtypes option). Loaded datasets
+# are converted to pd.ArrowDtype columns once, at load time, and stay Arrow
+# through the page transforms to st.dataframe, which then serializes them to
+# the browser without another conversion. Strings are held in Arrow buffers
+# instead of as one Python object per value. Steps that still convert a
+# column out of Arrow are logged at debug level at the checkpoints below,
+# through Streamlit's logger (run with --logger.level=debug).
+
+logger = get_logger(__name__)
+
+
+def arrow_enabled():
+    return get_option("arrow_dtypes", "off") == "on"
+
+
+def is_arrow(dtype):
+    return isinstance(dtype, pd.ArrowDtype) or (isinstance(dtype, pd.StringDtype) and dtype.storage == "pyarrow")
+
+
+# Convert the columns of a fetched frame to Arrow dtypes
+def to_arrow(df):
+    return df.convert_dtypes(dtype_backend="pyarrow")
+
+
+# Log the columns of df that are not Arrow-backed after the step named where,
+# when Arrow dtypes are on. Returns df, so it can wrap a step's result.
+def check_arrow(df, where):
+    if not isinstance(df, pd.DataFrame) or not logger.isEnabledFor(logging.DEBUG) or not arrow_enabled():
+        return df
+    converted = [f"{column} ({dtype})" for column, dtype in df.dtypes.items() if not is_arrow(dtype)]
+    if converted:
+        logger.debug("%s: columns not Arrow-backed: %s", where, ", ".join(converted))
+    return df
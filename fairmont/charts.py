@@ -0,0 +1,117 @@
+import hashlib
+
+import pandas as pd
+import streamlit as st
+
+from fairmont.datasets import CATALOGS, get_preview
+from fairmont.periods import month_key, month_start
+from fairmont.pipeline import Pipeline
+from fairmont.preview import estimate_sums, estimated_title
+
+# Plotly figures built once per content of their data and options. Building a
+# figure with many traces (px.line with a color per item) costs far more than
+# drawing it, and most reruns leave the chart data unchanged: a widget
+# elsewhere on the page, a view switch, a revisited filter state. Figures are
+# kept by a hash of the chart data's values plus the options they are built
+# with, so a rerun with the same chart only hands the finished figure to
+# st.plotly_chart.
+
+# Plotly itself is only imported by the figure builders, once a chart is
+# shown, so pages that draw none never pay for the import.
+
+# Figures kept per process, least recently used first to go
+FIGURE_ENTRIES = 64
+
+
+# Hash of what a figure is built from: the builder, the values, index,
+# columns and dtypes of data, and the options
+def content_hash(build, data, options):
+    digest = hashlib.sha256()
+    digest.update(f"{build.__code__.co_filename}:{build.__qualname__}".encode())
+    digest.update(pd.util.hash_pandas_object(data, index=True).to_numpy().tobytes())
+    digest.update(repr(list(zip(data.columns, map(str, data.dtypes)))).encode())
+    digest.update(repr(sorted(options.items())).encode())
+    return digest.hexdigest()
+
+
+@st.cache_resource(max_entries=FIGURE_ENTRIES, show_spinner=False)
+def _figure(key, _build, _data, _options):
+    return _build(_data, **_options)
+
+
+# Return the figure build(data, **options) makes, built once per content of
+# data and options and shared by all sessions. Like datasets, the figure must
+# be treated as read-only.
+def cached_figure(build, data, **options):
+    return _figure(content_hash(build, data, options), build, data, options)
+
+
+# Draw the cached figure of build for data and options (see cached_figure)
+def plotly_chart(build, data, use_container_width=False, **options):
+    st.plotly_chart(cached_figure(build, data, **options), use_container_width=use_container_width)
+
+
+# With fast previews on, the first load of a dataset shows its charts
+# estimated from a sample of its rows until the full dataset is in (see
+# fairmont.preview). estimate turns the sample's columns and the fraction of
+# rows it holds into the chart data, show draws them. Returns the placeholder
+# holding the charts, for the page to empty once the dataset has loaded.
+def preview_charts(name, columns, estimate, show):
+    preview = st.empty()
+    sample, fraction = get_preview(name, columns=columns)
+    if sample is not None:
+        data = estimate(sample, fraction)
+        with preview.container():
+            show(data, fraction)
+    return preview
+
+
+# The measures of both attendance datasets
+ATTENDANCE_MEASURES = ['Net Attendance', 'Net Value']
+
+
+# Sum a measure by the YYYYMM key column month and item, with the months as
+# dates, for an attendance chart
+def attendance_chart_data(df, month, measure):
+    data = Pipeline().group_sum([month, 'Item'], [measure]).run(df).rename(columns={month: 'Month'})
+    data['Month'] = month_start(data['Month'])
+    return data
+
+
+# Line chart of a measure by month and item. With fraction, the data are
+# estimates from a sample of that fraction of the rows.
+def measure_figure(chart_data, measure, title, fraction=None):
+    import plotly.express as px
+
+    return px.line(chart_data, x='Month', y=measure, color='Item',
+                   title=title if fraction is None else estimated_title(title, fraction),
+                   error_y=None if fraction is None else f'{measure} error',
+                   labels={'Month': 'Date', measure: measure}, markers=True)
+
+
+# Plot attendance and value by month and item, each figure built once for the
+# same chart data
+def attendance_charts(chart_data_attendance, chart_data_value, fraction=None):
+    for chart_data, measure, title in [(chart_data_attendance, 'Net Attendance', 'Attendance Over Time'),
+                                       (chart_data_value, 'Net Value', 'Net Value Over Time')]:
+        plotly_chart(measure_figure, chart_data, use_container_width=True,
+                     measure=measure, title=title, fraction=fraction)
+
+
+# Preview of the attendance charts of an attendance dataset (see
+# preview_charts), by the month of the date column month_of. The sample holds
+# the date columns dates the filters may use, the dataset's dimensions and
+# measures; prepare derives dimensions the way the page does before the
+# filters run.
+def attendance_preview(name, filters, month_of, dates, prepare=None):
+    def estimate(sample, fraction):
+        if prepare is not None:
+            sample = prepare(sample)
+        sample = filters.run(sample)
+        data = estimate_sums(sample.assign(Month=month_key(sample[month_of])), ['Month', 'Item'],
+                             ATTENDANCE_MEASURES, fraction)
+        data['Month'] = month_start(data['Month'])
+        return data
+
+    return preview_charts(name, [*dates, *CATALOGS[name], *ATTENDANCE_MEASURES], estimate,
+                          lambda data, fraction: attendance_charts(data, data, fraction))
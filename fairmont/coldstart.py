@@ -0,0 +1,114 @@
+import argparse
+import csv
+import json
+import os
+import subprocess
+import sys
+import time
+from collections import Counter
+from datetime import datetime
+from pathlib import Path
+
+# Cold-start profile of the pages. Each page is rendered in a fresh
+# interpreter with Streamlit already imported, as in a running server, against
+# the load test's stub session. Reports the time to the first render of the
+# page, what it imported on the way, and the time a new session takes once
+# the process is warm. Only standard library modules are imported here, so the
+# child processes start clean.
+
+ROOT = Path(__file__).resolve().parent.parent
+MARKER = "-- coldstart: render --"
+
+
+def _child(page, latency):
+    import streamlit  # noqa: F401
+    from streamlit.testing.v1 import AppTest
+
+    from fairmont import session
+
+    # Created on first use, so the stub's imports are not counted before the
+    # page's own
+    stub = []
+
+    def get_session():
+        if not stub:
+            from fairmont.loadtest import StubSession
+            stub.append(StubSession(latency=latency))
+        return stub[0]
+
+    session.get_session = get_session
+    print(MARKER, file=sys.stderr, flush=True)
+
+    started = time.perf_counter()
+    AppTest.from_file(page, default_timeout=300).run()
+    first_render = time.perf_counter() - started
+
+    started = time.perf_counter()
+    AppTest.from_file(page, default_timeout=300).run()
+    new_session = time.perf_counter() - started
+
+    print(json.dumps({"first render ms": round(first_render * 1000, 1), "new session ms": round(new_session * 1000, 1)}))
+
+
+# Self import time in ms of the modules imported after the marker, by
+# top-level package
+def _import_times(stderr):
+    packages = Counter()
+    lines = stderr.splitlines()
+    for line in lines[lines.index(MARKER) + 1:] if MARKER in lines else []:
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, _, name = line[len("import time:"):].split("|")
+        packages[name.strip().split(".")[0]] += int(self_us) / 1000
+    return packages
+
+
+def profile_page(page, latency=0.0, top=5):
+    # The stub returns plain frames, so preprocessing runs locally
+    env = {**os.environ, "FAIRMONT_PUSHDOWN": "off"}
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-m", "fairmont.coldstart", "--child", str(page), "--latency", str(latency)],
+        cwd=ROOT, capture_output=True, text=True, env=env,
+    )
+    timings = json.loads(result.stdout.strip().splitlines()[-1])
+    packages = _import_times(result.stderr)
+    return {
+        "page": Path(page).name,
+        **timings,
+        "import ms": round(sum(packages.values()), 1),
+        "top imports": ", ".join(f"{name} {ms:.0f}" for name, ms in packages.most_common(top)),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Profile the cold start of each page.")
+    parser.add_argument("--pages", nargs="*", help="only pages whose file name contains one of these")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds the stub waits per query")
+    parser.add_argument("--top", type=int, default=5, help="packages to list by import time")
+    parser.add_argument("--append", help="CSV file to append the results to, to track them over time")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        _child(args.child, args.latency)
+        sys.exit()
+
+    pages = [ROOT / "Main.py", *sorted((ROOT / "pages").glob("*.py"))]
+    rows = [profile_page(page, args.latency, args.top) for page in pages
+            if not args.pages or any(name in page.name for name in args.pages)]
+
+    width = max(len(row["page"]) for row in rows)
+    print(f"{'page':<{width}}  first render ms  new session ms  import ms  top imports (ms)")
+    for row in rows:
+        print(f"{row['page']:<{width}}  {row['first render ms']:15.0f}  {row['new session ms']:14.0f}"
+              f"  {row['import ms']:9.0f}  {row['top imports']}")
+
+    if args.append:
+        path = Path(args.append)
+        fields = ["date", *rows[0]]
+        with path.open("a", newline="") as file:
+            writer = csv.DictWriter(file, fields)
+            if path.stat().st_size == 0:
+                writer.writeheader()
+            date = datetime.now().isoformat(timespec="seconds")
+            writer.writerows({"date": date, **row} for row in rows)
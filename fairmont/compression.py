@@ -0,0 +1,81 @@
+import threading
+
+import pandas as pd
+import pyarrow as pa
+import streamlit as st
+from cachetools import LRUCache
+
+from fairmont.arrow import arrow_enabled
+from fairmont.config import get_option
+
+
+# Serialize a frame into a compressed Arrow IPC buffer. Frames Arrow cannot
+# represent (e.g. object columns with mixed types) are returned unchanged.
+def compress_frame(df, codec=None):
+    codec = codec or get_option("cache_codec", "zstd")
+    if not pa.Codec.is_available(codec):
+        codec = "lz4"
+    try:
+        table = pa.Table.from_pandas(df, preserve_index=False)
+    except (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError):
+        return df
+
+    sink = pa.BufferOutputStream()
+    options = pa.ipc.IpcWriteOptions(compression=codec)
+    with pa.ipc.new_file(sink, table.schema, options=options) as writer:
+        writer.write_table(table, max_chunksize=64 * 1024)
+    return sink.getvalue()
+
+
+# Decompress a buffer back into a frame, reading only the requested columns.
+# With Arrow dtypes on, the columns stay Arrow instead of becoming NumPy.
+def decompress_frame(buffer, columns=None):
+    options = None
+    if columns is not None:
+        names = pa.ipc.open_file(buffer).schema.names
+        missing = [col for col in columns if col not in names]
+        if missing:
+            raise KeyError(f"Columns not in dataset: {missing}")
+        options = pa.ipc.IpcReadOptions(included_fields=[names.index(col) for col in columns])
+    table = pa.ipc.open_file(buffer, options=options).read_all()
+    types_mapper = pd.ArrowDtype if arrow_enabled() else None
+    return table.to_pandas(types_mapper=types_mapper)[list(columns) if columns is not None else table.column_names]
+
+
+def _frame_size(df):
+    return int(df.memory_usage(deep=True).sum())
+
+
+# Decompressed frames are kept in a small LRU bounded by memory, so recently
+# used datasets stay hot while the rest are only held compressed. Holding it as
+# a resource means the Clear Cache button drops it along with the datasets.
+@st.cache_resource
+def _hot_cache():
+    budget = int(get_option("hot_cache_mb", 256)) * 1024 * 1024
+    return threading.Lock(), LRUCache(maxsize=budget, getsizeof=_frame_size)
+
+
+def get_hot_frame(key, buffer, columns=None):
+    lock, frames = _hot_cache()
+    cache_key = (key, tuple(columns) if columns is not None else None)
+    with lock:
+        df = frames.get(cache_key)
+    if df is not None:
+        return df
+
+    df = decompress_frame(buffer, columns)
+    with lock:
+        try:
+            frames[cache_key] = df
+        except ValueError:
+            # Larger than the whole hot budget, serve it without caching
+            pass
+    return df
+
+
+# Drop the decompressed frames of key, whatever their columns
+def drop_hot_frames(key):
+    lock, frames = _hot_cache()
+    with lock:
+        for cache_key in [cache_key for cache_key in frames if cache_key[0] == key]:
+            del frames[cache_key]
@@ -0,0 +1,17 @@
+import os
+
+import streamlit as st
+
+
+# Read an app option from the environment (FAIRMONT_<NAME>) or the [fairmont]
+# section of st.secrets, falling back to the given default
+def get_option(name, default=None):
+    value = os.environ.get(f"FAIRMONT_{name.upper()}")
+    if value is not None:
+        return value
+    try:
+        if st.secrets.load_if_toml_exists():
+            return st.secrets["fairmont"][name]
+    except Exception:
+        pass
+    return default
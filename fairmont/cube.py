@@ -0,0 +1,8 @@
+# Pre-aggregate rows into a cube with one row per distinct combination of
+# dimensions and the measures summed. Filtering the cube on its dimensions
+# and rolling it up gives the same totals as doing so on the rows it was built
+# from, at a fraction of the size. Null dimension values are kept as their own
+# combinations, so filters see the same values as on the rows. Groups keep the
+# order the rows first appear in, so do the values of each dimension.
+def build_cube(df, dimensions, measures):
+    return df.groupby(dimensions, dropna=False, sort=False)[measures].sum().reset_index()
@@ -0,0 +1,113 @@
+import numpy as np
+import pandas as pd
+
+NS_PER_DAY = 86_400_000_000_000
+
+
+def _day(timestamp):
+    return pd.Timestamp(timestamp).value // NS_PER_DAY
+
+
+# Totals and distinct counts of a set of rows over any range of days, built
+# once from the rows' timestamps. Sums are stored as per-day prefix sums, so a
+# range total is the difference of two entries however long the history is.
+# Distinct counts are exact: each value is stored once per day it occurs,
+# with the previous day it was seen, and a value counts towards a range on its
+# first day inside the range.
+class DailyIndex:
+    # sums is a frame of additive columns and distinct maps a name to values
+    # to count distinct non-null values of, both aligned with timestamps.
+    # Rows without a timestamp are left out.
+    def __init__(self, timestamps, sums, distinct=None):
+        dated = timestamps.notna().to_numpy()
+        days = timestamps.to_numpy(dtype="datetime64[ns]")[dated].view(np.int64) // NS_PER_DAY
+
+        # Daily totals of the days that have rows, and running totals over all
+        # days from the first, with a leading zero
+        self.daily = sums[dated].groupby(days).sum()
+        self.first = int(self.daily.index.min()) if len(self.daily) else 0
+        last = int(self.daily.index.max()) if len(self.daily) else self.first - 1
+        every_day = self.daily.reindex(np.arange(self.first, last + 1), fill_value=0)
+        self.prefix = {column: np.concatenate([[0], every_day[column].to_numpy().cumsum()])
+                       for column in every_day.columns}
+        self.size = last + 1 - self.first
+
+        self.distinct = {}
+        for name, values in (distinct or {}).items():
+            pairs = pd.DataFrame({"day": days, "value": values[dated].to_numpy()})
+            pairs = pairs.dropna().drop_duplicates().sort_values("day", kind="stable")
+            previous = pairs.groupby("value", sort=False)["day"].shift(fill_value=np.iinfo(np.int64).min)
+            self.distinct[name] = (pairs["day"].to_numpy(), previous.to_numpy())
+
+    # First and last day with rows, as timestamps
+    @property
+    def first_day(self):
+        return pd.Timestamp(self.first * NS_PER_DAY)
+
+    @property
+    def last_day(self):
+        return pd.Timestamp((self.first + self.size - 1) * NS_PER_DAY)
+
+    def _offsets(self, start, end):
+        first = min(max(_day(start) - self.first, 0), self.size)
+        last = min(max(_day(end) - self.first, 0), self.size)
+        return first, max(first, last)
+
+    # Total of column over the days from start up to, not including, end
+    def sum(self, column, start, end):
+        first, last = self._offsets(start, end)
+        prefix = self.prefix[column]
+        return prefix[last] - prefix[first]
+
+    # Totals of every column over the days from start up to end
+    def totals(self, start, end):
+        first, last = self._offsets(start, end)
+        return pd.Series({column: prefix[last] - prefix[first] for column, prefix in self.prefix.items()})
+
+    # Number of distinct values of name over the days from start up to end
+    def count_distinct(self, name, start, end):
+        days, previous = self.distinct[name]
+        first, last = np.searchsorted(days, [_day(start), _day(end)])
+        return int(np.count_nonzero(previous[first:last] < _day(start)))
+
+    # Daily totals of the days from start up to end that have rows, indexed
+    # by date
+    def days(self, start, end):
+        daily = self.daily.loc[_day(start):_day(end) - 1]
+        return daily.set_axis(pd.to_datetime(daily.index.to_numpy() * NS_PER_DAY))
+
+
+if __name__ == "__main__":
+    # Range totals, distinct counts and daily totals match filtering the rows
+    # directly, over random rows with missing timestamps and values and random
+    # ranges reaching past both ends of the data
+    rng = np.random.default_rng(0)
+    for trial in range(50):
+        size = int(rng.integers(0, 60))
+        timestamps = pd.Series(pd.Timestamp("2024-01-01")
+                               + pd.to_timedelta(rng.integers(0, 30 * NS_PER_DAY, size), unit="ns"))
+        timestamps[rng.random(size) < 0.1] = pd.NaT
+        sums = pd.DataFrame({"count": rng.integers(0, 5, size),
+                             "value": np.where(rng.random(size) < 0.2, np.nan, rng.random(size).round(2))})
+        values = pd.Series(rng.choice(["a", "b", "c", "d", None], size), dtype=object)
+        # Rows as the pages pass them, on an index other than 0..n-1
+        index = rng.permutation(size) * 3
+        timestamps.index = sums.index = values.index = index
+        daily = DailyIndex(timestamps, sums, {"values": values})
+
+        for _ in range(20):
+            start, end = sorted(pd.Timestamp("2023-12-25")
+                                + pd.to_timedelta(rng.integers(0, 45 * NS_PER_DAY, 2), unit="ns"))
+            dates = timestamps.dt.floor("D")
+            rows = (dates >= start.floor("D")) & (dates < end.floor("D"))
+            expected = sums[rows].sum()
+            assert daily.sum("count", start, end) == expected["count"], (trial, start, end)
+            assert np.isclose(daily.sum("value", start, end), expected["value"]), (trial, start, end)
+            totals = daily.totals(start, end)
+            assert totals["count"] == expected["count"] and np.isclose(totals["value"], expected["value"]), (trial, start, end)
+            assert daily.count_distinct("values", start, end) == values[rows].nunique(), (trial, start, end)
+            expected_days = sums[rows].groupby(dates[rows]).sum()
+            result = daily.days(start, end)
+            assert list(result.index) == list(expected_days.index), (trial, start, end)
+            assert np.allclose(result.to_numpy(dtype=float), expected_days.to_numpy(dtype=float)), (trial, start, end)
+    print("DailyIndex: sum, totals, count_distinct and days match filtering over 50 random sets of rows")
@@ -0,0 +1,319 @@
+from dataclasses import replace
+
+import pandas as pd
+import streamlit as st
+
+from fairmont import session
+from fairmont.arrow import check_arrow
+from fairmont.compression import compress_frame, get_hot_frame
+from fairmont.config import get_option
+from fairmont.jobs import run_query
+from fairmont.pipeline import Pipeline
+from fairmont.preview import preview_enabled, sample_percent
+from fairmont.queries import bind_sql, canonicalize, record_miss, record_request
+from fairmont.schema import ROW_KEY, Column, Schema, apply_schema, count_sql, distinct_sql
+from fairmont.store import count_rows, drop_samples, get_dataset, is_loaded, load_stats
+
+# The base datasets read by the pages, by name: their source and the
+# preprocessing run in the warehouse. Each is loaded once per process and
+# shared by every page and session. Pages add their own filters, renames and
+# computed columns on top as derived views (see get_view).
+DATASETS = {}
+
+# The dimensions pages filter each dataset on, by dataset name, for its
+# dimension catalog (see get_catalog)
+CATALOGS = {}
+
+# Seconds a dimension catalog is kept before it is read again
+CATALOG_TTL = float(get_option("catalog_ttl", 3600))
+
+
+def register(name, source, pushdown=None, dimensions=None):
+    if dimensions and not isinstance(source, Schema):
+        raise ValueError(f"Dataset {name!r} needs a Schema source for a dimension catalog")
+    DATASETS[name] = (source, pushdown)
+    if dimensions:
+        CATALOGS[name] = list(dimensions)
+
+
+# Return a shallow view of a registered base dataset, or None on failure
+def get_base(name, columns=None):
+    source, pushdown = DATASETS[name]
+    return get_dataset(name, source, columns=columns, pushdown=pushdown)
+
+
+# Caption the duplicate rows dropped from a registered base dataset when it
+# was loaded, if any. Pages show it once, however often they read the dataset.
+def duplicates_caption(name):
+    duplicates = load_stats().get(name, {}).get("duplicates", 0)
+    if duplicates:
+        source, _ = DATASETS[name]
+        st.caption(f"{duplicates:,} duplicate rows were removed from {source.table}.")
+
+
+# Return a random sample of a registered base dataset for a fast preview and
+# the fraction of rows it holds, sized from the table's row count. Returns
+# None and None unless fast previews are on and the base is still to be
+# loaded, as well as when the base is not a Schema, when a sample would hold
+# most of the table, or on failure. Once the base is loaded, its samples are
+# dropped.
+def get_preview(name, columns=None):
+    source, pushdown = DATASETS[name]
+    if not preview_enabled() or not isinstance(source, Schema):
+        return None, None
+    if is_loaded(name):
+        drop_samples(name)
+        return None, None
+    try:
+        percent = sample_percent(count_rows(count_sql(source)))
+    except Exception as e:
+        st.error(f"Failed to execute query or process data: {str(e)}")
+        return None, None
+    if percent is None:
+        return None, None
+    df = get_dataset(name, source, columns=columns, pushdown=pushdown, sample=percent)
+    return (df, percent / 100) if df is not None else (None, None)
+
+
+# The query of a dataset's dimension catalog, the schema of the columns it
+# returns and the preprocessing steps to run on them. Only the dimensions and
+# the columns the dataset's preprocessing needs to decide them are selected.
+def catalog_plan(name):
+    source, pushdown = DATASETS[name]
+    steps, needed = (pushdown or Pipeline()).restrict(CATALOGS[name])
+    projection = replace(source, columns=[col for col in source.columns if col.label in needed], key=None)
+    return distinct_sql(projection), projection, steps
+
+
+# A stable identifier of a function for cache keys, which leave out the
+# function itself: pages run as __main__, so their file tells apart functions
+# of the same name
+def _function_key(function):
+    if function is None:
+        return None
+    return f"{function.__code__.co_filename}:{function.__qualname__}"
+
+
+@st.cache_resource(ttl=CATALOG_TTL, show_spinner=False)
+def _catalog(name, prepare_key=None, _prepare=None):
+    query, projection, steps = catalog_plan(name)
+    query, params = canonicalize(query)
+    record_miss(query)
+    df = run_query(f"{name}:catalog", bind_sql(session.get_session(), query, params), (query, tuple(params)))
+    df = steps.run(apply_schema(df, projection))
+    dimensions = CATALOGS[name]
+    catalog = df[dimensions].drop_duplicates().sort_values(dimensions, ignore_index=True)
+    return _prepare(catalog) if _prepare is not None else catalog
+
+
+# Return the dimension catalog of a registered dataset, or None on failure:
+# the distinct combinations of its dimensions after preprocessing, sorted by
+# them. It is read with a small SELECT DISTINCT rather than from the loaded
+# dataset, so pages can draw their filters before the dataset loads. Each
+# catalog is shared by all sessions and read again every catalog_ttl seconds,
+# on its own cycle from the dataset. Like datasets, it must be treated as
+# read-only. prepare derives dimensions from the catalog the way the page
+# derives them from the dataset, e.g. a status decided by two columns; each
+# prepare function has its own catalog.
+def get_catalog(name, prepare=None):
+    record_request(canonicalize(catalog_plan(name)[0])[0])
+    try:
+        catalog = _catalog(name, _function_key(prepare), prepare)
+    except Exception as e:
+        st.error(f"Failed to execute query or process data: {str(e)}")
+        return None
+    return catalog.copy(deep=False)
+
+
+# A derived view is computed once per load of its base and then shared the
+# same way, so pages deriving the same view by name hold one frame between
+# them. Like prepare functions, derive may modify the frame it is given.
+@st.cache_resource(show_spinner=False)
+def _derived(name, base, version, _df, _derive):
+    result = check_arrow(_derive(_df), f"{name}: derive")
+    if isinstance(result, pd.DataFrame) and get_option("cache_tier", "memory") == "compressed":
+        return compress_frame(result)
+    return result
+
+
+# Return a shallow view of the derived view name, built from the base dataset
+# by derive, or None on failure. Passing columns limits the view to those
+# columns.
+def get_view(name, base, derive, columns=None):
+    df = get_base(base)
+    if df is None:
+        return None
+    version = load_stats().get(base, {}).get("version")
+    try:
+        data = _derived(name, base, version, df, derive)
+        if isinstance(data, pd.DataFrame):
+            view = data if columns is None else data[list(columns)]
+        else:
+            view = get_hot_frame(name, data, columns)
+    except Exception as e:
+        st.error(f"Failed to process data: {str(e)}")
+        return None
+    return view.copy(deep=False)
+
+
+# Return an index built from the base dataset by build, or None on failure.
+# Indexes are objects other than frames that answer a page's queries, e.g. a
+# DailyIndex of range totals. They are built and shared like derived views and
+# must be treated as read-only.
+def get_index(name, base, build):
+    df = get_base(base)
+    if df is None:
+        return None
+    version = load_stats().get(base, {}).get("version")
+    try:
+        return _derived(name, base, version, df, build)
+    except Exception as e:
+        st.error(f"Failed to process data: {str(e)}")
+        return None
+
+
+# Both attendance datasets keep the same sources and clean up the same way
+ATTENDANCE_SOURCES = ['guestportal', 'internal', '', 'fairmontbanff']
+
+attendance_preprocessing = (
+    Pipeline()
+    # Replace nulls in the dimension columns with 'Unknown'
+    .fillna({column: 'Unknown' for column in ['Item', 'Department', 'Source', 'Network', 'Venue', 'Booking Status']})
+    # Keep only the rows where 'Source' is in the list of sources to keep
+    .filter_in('Source', ATTENDANCE_SOURCES)
+    # Handle Value column with ValueAdded
+    .coalesce('Net Value', 'ValueAdded')
+)
+
+# The grouped tables publish no business key, so only identical rows are
+# dropped as duplicates, as by drop_duplicates() before
+register("bookings", Schema(
+    table="SALES_ANALYTICS.PUBLIC.FAIRMONT_UVE_BOOKINGS_GROUPED",
+    columns=[
+        Column('P_CALDATE', 'datetime', 'Event Date'),
+        Column('B_ITEMNAME', 'str', 'Item'),
+        Column('P_VENUENAME', 'str', 'Venue'),
+        Column('PRODUCT_CATEGORY', 'str', 'Department'),
+        Column('SOURCE', 'str', 'Source'),
+        Column('NETWORK', 'str', 'Network'),
+        Column('P_CURRENTSTATUS', 'str', 'Booking Status'),
+        Column('GUESTS', 'number', 'Net Attendance'),
+        Column('B_VALUE', 'number', 'Net Value'),
+        Column('ADDED_PRICE', 'number', 'ValueAdded'),
+    ],
+    key=ROW_KEY,
+), pushdown=attendance_preprocessing, dimensions=['Source', 'Network', 'Department', 'Venue', 'Item', 'Booking Status'])
+
+register("transactions", Schema(
+    table="SALES_ANALYTICS.PUBLIC.FAIRMONT_UVE_TRANSACTIONS_GROUPED",
+    columns=[
+        Column('TB_TRANSDATE', 'datetime', 'Transaction Date'),
+        Column('TI_CALDATE', 'datetime', 'Event Date'),
+        Column('TI_ITEMNAME', 'str', 'Item'),
+        Column('VP_VENUENAME', 'str', 'Venue'),
+        Column('PRODUCT_CATEGORY', 'str', 'Department'),
+        Column('SOURCE', 'str', 'Source'),
+        Column('NETWORK', 'str', 'Network'),
+        Column('P_CURRENTSTATUS', 'str', 'Booking Status'),
+        Column('TI_STATUS', 'str', 'Transaction Status'),
+        Column('TB_ACTION', 'str'),
+        Column('TB_GUESTS', 'number', 'Net Attendance'),
+        Column('TB_SUBTOTALAGREE', 'number', 'Net Value'),
+        Column('ADDED_PRICE', 'number', 'ValueAdded'),
+    ],
+    key=ROW_KEY,
+), pushdown=attendance_preprocessing,
+    # With the status, TB_ACTION decides the Transaction Status pages show
+    dimensions=['Source', 'Network', 'Department', 'Venue', 'Item', 'Transaction Status', 'TB_ACTION'])
+
+register("report_items", Schema(
+    table="SALES_ANALYTICS.PUBLIC.FAIRMONT_REPORT_ITEMS",
+    columns=[
+        # YYYYMM in the table, kept as an integer month key
+        Column('BOOKED_MONTH', 'number', 'Booked Year Month'),
+        Column('ITEM_NAME', 'str', 'Item Name'),
+        Column('PRODUCT_CATEGORY', 'str', 'Department'),
+        Column('VIEWED', 'number', 'View'),
+        Column('CONVERSION', 'number', 'Conversion'),
+        Column('TRANSACTIONS', 'number', 'Gross Booked'),
+        Column('ITEMSPURCHASED', 'number', 'Gross Quantity'),
+        Column('BOOKED', 'number', 'Net Booked'),
+        Column('ATTENDANCE', 'number', 'Net Attendance'),
+        Column('VALUE', 'number', 'Net Value'),
+        Column('VALUEADDED', 'number', 'ValueAdded'),
+        Column('CANCELLED', 'number', 'Cancelled'),
+        Column('OTHER_STATUS', 'number', 'Other Status'),
+    ],
+    key=ROW_KEY,
+), pushdown=(
+    Pipeline()
+    # Replace null Item Name and Department with 'Unknown'
+    .fillna({'Item Name': 'Unknown', 'Department': 'Unknown'})
+    # Replace 0 or NaN in 'Net Value' with 'ValueAdded'
+    .coalesce('Net Value', 'ValueAdded')
+), dimensions=['Booked Year Month', 'Department', 'Item Name'])
+
+register("email_analysis", """
+    SELECT
+        *
+    FROM
+        SALES_ANALYTICS.PUBLIC.FAIRMONT_EMAIL_ANALYSIS
+    """)
+
+register("email_conversion", Schema(
+    table="SALES_ANALYTICS.PUBLIC.FAIRMONT_EMAIL_CONVERSION_RESULTS",
+    columns=[
+        Column('year_month', 'str', 'Year Month'),
+        Column('count_id_notification_60_days', 'number', 'Email/60'),
+        Column('count_id_fellowship_60_days', 'number', 'Profile Converted/60'),
+        Column('count_transid_transbook_60_days', 'number', 'Gross Booked/60'),
+        Column('sum_guests_transbook_60_days', 'number', 'Gross Guests/60'),
+        Column('sum_subtotalagree_transbook_60_days', 'number', 'Gross Value/60'),
+        Column('count_id_notification_30_days', 'number', 'Email/30'),
+        Column('count_id_fellowship_30_days', 'number', 'Profile Converted/30'),
+        Column('count_transid_transbook_30_days', 'number', 'Gross Booked/30'),
+        Column('sum_guests_transbook_30_days', 'number', 'Gross Guests/30'),
+        Column('sum_subtotalagree_transbook_30_days', 'number', 'Gross Value/30'),
+        Column('count_id_notification_7_days', 'number', 'Email/7'),
+        Column('count_id_fellowship_7_days', 'number', 'Profile Converted/7'),
+        Column('count_transid_transbook_7_days', 'number', 'Gross Booked/7'),
+        Column('sum_guests_transbook_7_days', 'number', 'Gross Guests/7'),
+        Column('sum_subtotalagree_transbook_7_days', 'number', 'Gross Value/7'),
+        Column('conversion_percentage_60_days', 'number', 'Conversion Rate/60'),
+        Column('conversion_percentage_30_days', 'number', 'Conversion Rate/30'),
+        Column('conversion_percentage_7_days', 'number', 'Conversion Rate/7'),
+    ],
+))
+
+register("mandrill", Schema(
+    table="SALES_ANALYTICS.PUBLIC.FAIRMONT_MANDRILL_NOTIFICATIONS",
+    columns=[
+        Column('DATA_TS_DATE', 'datetime'),
+        Column('NOTIFICATION_TAG'),
+        Column('DATA_SUBJECT'),
+        Column('DATA_ID'),
+        Column('SENT', 'number'),
+        Column('OPEN', 'number'),
+        Column('DATA_CLICKS', 'number'),
+        Column('CLICKS', 'number'),
+        Column('DATA_STATE'),
+        Column('DATA_OPENS', 'number'),
+        Column('DATA_OPENS_DETAIL'),
+        Column('DATA_CLICKS_DETAIL'),
+    ],
+    where="DATA_TS_DATE >= '2023-03-01' and DATA_TS_DATE <= '2030-12-31'",
+))
+
+register("email_conversion_detail", Schema(
+    table="SALES_ANALYTICS.PUBLIC.FAIRMONT_EMAIL_CONVERSION",
+    columns=[
+        Column('createtstamp_notification', 'datetime'),
+        Column('extra_notification'),
+        Column('subject_notification'),
+        Column('id_fellowship', 'number'),
+        Column('id_notification', 'number'),
+        Column('guests_transbook', 'number'),
+        Column('qty_transbook', 'number'),
+    ],
+    where="\"createtstamp_notification\" BETWEEN '2010-01-01 00:00:00.000' AND '2050-12-31 23:59:59.999'",
+))
@@ -0,0 +1,32 @@
+import streamlit as st
+
+from fairmont.pipeline import Pipeline
+
+# printf-style formats for st.column_config number columns. Values stay
+# numeric in the frame, so they sort as numbers and are serialized through
+# Arrow as-is; only the browser formats them.
+DECIMAL = "%.2f"
+PERCENT = "%.2f%%"
+
+
+# Column config showing each of columns as a number with the given format
+def number_config(columns, format=DECIMAL):
+    return {column: st.column_config.NumberColumn(format=format) for column in columns}
+
+
+# Display a grand total row with two decimals, through the same Arrow path
+# as the table it totals
+def grand_total_table(grand_total):
+    st.dataframe(grand_total, column_config=number_config(grand_total.columns), use_container_width=True)
+
+
+# Grand total row of the measures of df, rounded to 2 decimal places
+def grand_total_row(df, measures):
+    grand_total = Pipeline().totals(measures).run(df)
+    grand_total.index = ['Grand Total']
+    return grand_total.round(2)
+
+
+# Function to convert DataFrame to CSV
+def convert_df_to_csv(df):
+    return df.to_csv(index=False).encode('utf-8')
@@ -0,0 +1,247 @@
+import gzip
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import pandas as pd
+import streamlit as st
+
+from fairmont import session
+from fairmont.config import get_option
+from fairmont.datasets import DATASETS
+from fairmont.pipeline import Pipeline
+from fairmont.queries import bind_sql
+from fairmont.schema import Schema, apply_schema, quote_identifier, select_sql
+
+# Full-history exports of a dataset's filtered rows, run as background jobs
+# instead of inside a rerun. A worker streams the rows in chunks into a
+# gzipped CSV file under exports_dir, so the whole history is never held in
+# memory. With export_stage set, every step running in the warehouse and the
+# rows written as they are, the rows are unloaded to the stage with COPY INTO
+# instead and the file is downloaded from there. One queue per process runs at
+# most export_workers exports at a time, later ones wait their turn.
+
+CHUNK_ROWS = 100_000
+# Seconds between checks for a cancel while the warehouse unloads to a stage
+CANCEL_POLL_SECONDS = 0.5
+# Finished files are removed after a day
+KEEP_SECONDS = 24 * 3600
+
+
+class ExportJob:
+    def __init__(self, file_name):
+        self.id = uuid.uuid4().hex[:12]
+        self.file_name = file_name
+        self.path = Path(get_option("exports_dir", ".exports")) / f"{self.id}-{file_name}"
+        self.status = "queued"
+        self.rows = 0
+        self.error = None
+        self.cancelled = threading.Event()
+
+    @property
+    def active(self):
+        return self.status in ("queued", "running")
+
+
+@st.cache_resource
+def export_queue():
+    return ThreadPoolExecutor(max_workers=int(get_option("export_workers", 2)), thread_name_prefix="export")
+
+
+def _remove_old_exports(directory):
+    for path in directory.glob("*"):
+        if time.time() - path.stat().st_mtime > KEEP_SECONDS:
+            path.unlink(missing_ok=True)
+
+
+# The rows of a query result as frames of up to CHUNK_ROWS rows. Snowpark
+# streams them with to_pandas_batches, other sessions fetch them at once.
+def _chunks(result):
+    if hasattr(result, "to_pandas_batches"):
+        yield from result.to_pandas_batches()
+        return
+    df = result.to_pandas()
+    for start in range(0, len(df), CHUNK_ROWS):
+        yield df.iloc[start:start + CHUNK_ROWS]
+
+
+# Unload the finished rows of an export job to the stage with COPY INTO, as
+# an async query that is cancelled in the warehouse if the job is cancelled,
+# and download the file. Returns whether the file was downloaded.
+def _unload(job, snowflake_session, result, stage):
+    location = f"{stage.rstrip('/')}/{job.path.name}"
+    unload = result.write.copy_into_location(
+        location, file_format_type="csv", format_type_options={"COMPRESSION": "GZIP"},
+        header=True, single=True, overwrite=True, max_file_size=5 * 2**30, block=False,
+    )
+    while not unload.is_done():
+        if job.cancelled.wait(CANCEL_POLL_SECONDS):
+            unload.cancel()
+            return False
+    unloaded = unload.result()
+    job.rows = int(unloaded[0][0]) if unloaded else 0
+    if job.cancelled.is_set():
+        return False
+    snowflake_session.file.get(location, str(job.path.parent))
+    return True
+
+
+# Frame of the column totals of each exported chunk, with the columns' dtypes,
+# for the totals function of an export. Without chunks the totals are NaN.
+def _chunk_totals(parts, columns):
+    if not parts:
+        return pd.DataFrame(columns=columns, dtype=float)
+    return pd.concat(parts, ignore_index=True).reindex(columns=columns)
+
+
+# Run an export job on a worker. before runs the preprocessing left to do
+# locally, then prepare and after, which holds the filters left to do, on each
+# chunk in turn. With neither, the query returns the finished rows. format
+# turns each chunk of the columns into the rows written, and totals turns the
+# column totals of every chunk into the total row written last (see
+# start_export). Columns only the total row has (e.g. an overall rate) are
+# added after the others, as when concatenating the rows and the total row.
+def _run_export(job, snowflake_session, schema, warehouse, before, prepare, after, columns, stage, format, totals):
+    if job.cancelled.is_set():
+        job.status = "cancelled"
+        return
+    job.status = "running"
+    partial = job.path.with_suffix(".partial")
+    local = before is not None or prepare is not None or after is not None
+    try:
+        result = bind_sql(snowflake_session, select_sql(schema))
+        if warehouse is not None:
+            result = warehouse.run(result, engine="snowpark")
+            if not local:
+                result = result.select([quote_identifier(column) for column in columns])
+
+        if stage and not local and format is None and totals is None:
+            if not _unload(job, snowflake_session, result, stage):
+                job.path.unlink(missing_ok=True)
+                job.status = "cancelled"
+                return
+        else:
+            header, parts = list(columns), []
+            if totals is not None:
+                header += [column for column in totals(_chunk_totals([], columns)).columns if column not in header]
+            with gzip.open(partial, "wt", newline="") as file:
+                file.write(pd.DataFrame(columns=header).to_csv(index=False))
+                for chunk in _chunks(result):
+                    if job.cancelled.is_set():
+                        break
+                    if chunk.empty:
+                        continue
+                    if before is not None:
+                        chunk = before.run(chunk, engine="pandas")
+                    if local:
+                        chunk = apply_schema(chunk, schema)
+                    if prepare is not None:
+                        chunk = prepare(chunk)
+                    if after is not None:
+                        chunk = after.run(chunk, engine="pandas")
+                    chunk = chunk[columns]
+                    if totals is not None:
+                        parts.append(chunk.select_dtypes("number").agg(["sum"]))
+                    rows = format(chunk) if format is not None else chunk
+                    rows.reindex(columns=header).to_csv(file, index=False, header=False)
+                    job.rows += len(chunk)
+                if totals is not None and not job.cancelled.is_set():
+                    total = totals(_chunk_totals(parts, columns))
+                    total.reindex(columns=header).to_csv(file, index=False, header=False)
+            if job.cancelled.is_set():
+                partial.unlink(missing_ok=True)
+                job.status = "cancelled"
+                return
+            os.replace(partial, job.path)
+        job.status = "done"
+    except Exception as e:
+        partial.unlink(missing_ok=True)
+        job.error = str(e)
+        job.status = "failed"
+
+
+# Queue an export of the columns of a registered dataset's rows, after its
+# preprocessing, prepare and the page's filters, and return its job. prepare
+# derives columns the way the page does (e.g. a status) and runs on every
+# chunk, filters may use those columns. Without prepare the filters run in the
+# warehouse along with the preprocessing, when pushdown is on. format formats
+# the exported columns the way the page shows them (e.g. months as labels).
+# totals makes the total row appended to the file, like the page's grand
+# total row: it is given a frame of the column totals of each chunk, so it
+# totals them as it would total the rows.
+def start_export(name, columns, filters=None, prepare=None, file_name="export.csv.gz", format=None, totals=None):
+    source, pushdown = DATASETS[name]
+    if not isinstance(source, Schema):
+        raise ValueError(f"Dataset {name!r} needs a Schema source to be exported")
+    snowflake_session = session.get_session()
+    if snowflake_session is None:
+        raise RuntimeError("Session is not initialized.")
+
+    pushdown = pushdown or Pipeline()
+    filters = filters or Pipeline()
+    if get_option("pushdown", "on") == "on" and session.is_live():
+        before = None
+        if prepare is None:
+            warehouse, after = Pipeline(pushdown.steps + filters.steps), None
+        else:
+            warehouse, after = pushdown, filters
+    else:
+        warehouse, before, after = None, pushdown, filters
+
+    job = ExportJob(file_name)
+    job.path.parent.mkdir(parents=True, exist_ok=True)
+    _remove_old_exports(job.path.parent)
+    export_queue().submit(_run_export, job, snowflake_session, source, warehouse, before, prepare, after,
+                          list(columns), get_option("export_stage"), format, totals)
+    return job
+
+
+# Progress of a running export, updated every second until it ends. The run
+# waits here, so pages draw the export button last; using any widget ends the
+# wait with a rerun, which comes back here while the export runs. Not a
+# fragment, since pages draw it inside their own fragments and Streamlit 1.35
+# does not nest them.
+def _export_progress(job):
+    progress, cancel = st.empty(), st.empty()
+    if cancel.button("Cancel export", key=f"{job.id}_cancel"):
+        job.cancelled.set()
+    while job.active:
+        if job.status == "queued":
+            progress.caption("Export queued, waiting for other exports to finish...")
+        else:
+            progress.caption(f"Exporting... {job.rows:,} rows written")
+        time.sleep(1)
+    progress.empty()
+    cancel.empty()
+
+
+# Button exporting the full history of a dataset's filtered rows in the
+# background (see start_export), followed by the state of this session's
+# last export from it: its progress while it runs (see _export_progress) and
+# the file once ready
+def export_button(key, name, columns, filters=None, prepare=None, file_name="export.csv.gz",
+                  label="Export Full History as CSV", format=None, totals=None):
+    state_key = f"_export_{key}"
+    job = st.session_state.get(state_key)
+    if st.button(label, key=key, disabled=job is not None and job.active):
+        try:
+            job = st.session_state[state_key] = start_export(name, columns, filters, prepare, file_name,
+                                                             format, totals)
+        except Exception as e:
+            st.error(f"Failed to start the export: {str(e)}")
+
+    if job is None:
+        return
+    if job.active:
+        _export_progress(job)
+    if job.status == "done" and job.path.exists():
+        with job.path.open("rb") as file:
+            st.download_button(label=f"Download {job.file_name} ({job.rows:,} rows)", data=file,
+                               file_name=job.file_name, mime="application/gzip", key=f"{job.id}_download")
+    elif job.status == "failed":
+        st.error(f"Export failed: {job.error}")
+    elif job.status == "cancelled":
+        st.caption("Export cancelled.")
@@ -0,0 +1,143 @@
+import inspect
+import threading
+import time
+
+import streamlit as st
+from streamlit.runtime.scriptrunner import RerunException
+
+# Queries run as async jobs (Snowpark's AsyncJob) instead of blocking calls,
+# so a query whose result is no longer needed can be cancelled in the
+# warehouse rather than left running. Each browser session tracks the jobs its
+# superseded runs left running in session state, by slot.
+
+JOBS_KEY = "_query_jobs"
+POLL_SECONDS = 0.05
+# Seconds a job finished after its last run left is still picked up
+ABANDONED_SECONDS = 60
+
+
+# Stands in for an AsyncJob with sessions that only run queries synchronously
+# (recording and replay), holding the finished frame
+class CompletedJob:
+    def __init__(self, df):
+        self.df = df
+
+    def is_done(self):
+        return True
+
+    def result(self, result_type=None):
+        return self.df
+
+    def cancel(self):
+        pass
+
+
+# Submit a query result (session.sql(...) plus any pushed down steps) as a job
+def submit(result):
+    if "block" in inspect.signature(result.to_pandas).parameters:
+        return result.to_pandas(block=False)
+    return CompletedJob(result.to_pandas())
+
+
+# Reading session state is a point where Streamlit stops the current run if a
+# newer rerun or a stop was requested, so waiting here ends superseded runs
+def _yield():
+    return JOBS_KEY in st.session_state
+
+
+def _sleep(seconds):
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        _yield()
+        time.sleep(min(POLL_SECONDS, max(0, deadline - time.monotonic())))
+
+
+# Queries running in the warehouse, by key, shared by all sessions of the
+# process. A job stays here while any run waits on it, and after a rerun
+# interrupts its last waiter, so the next run needing the same query attaches
+# to it instead of starting it again. Kept outside the caches: it tracks work
+# in the warehouse, not results, and must survive a cache clear.
+_RUNNING = {}
+_LOCK = threading.Lock()
+
+
+class _Running:
+    def __init__(self, job):
+        self.job = job
+        self.waiters = 0
+        self.left = time.monotonic()
+
+    # A finished job nobody came back for in time, whose result may be stale
+    @property
+    def abandoned(self):
+        return self.waiters == 0 and self.job.is_done() and time.monotonic() - self.left > ABANDONED_SECONDS
+
+
+def _attach(key, result):
+    with _LOCK:
+        running = _RUNNING.get(key)
+        if running is not None and not running.abandoned:
+            running.waiters += 1
+            return running
+    # Submitted outside the lock, sessions that only run queries synchronously
+    # finish the query here
+    job = submit(result)
+    with _LOCK:
+        running = _RUNNING.get(key)
+        if running is None or running.abandoned:
+            running = _RUNNING[key] = _Running(job)
+        else:
+            job.cancel()
+        running.waiters += 1
+        return running
+
+
+# Stop waiting on the job of key. Unless keep is set, the job is dropped once
+# no run waits on it (see _drop); with keep a later run may still attach to it.
+def _detach(key, running, keep=False):
+    with _LOCK:
+        running.waiters -= 1
+        running.left = time.monotonic()
+    if not keep:
+        _drop(key, running)
+
+
+# Forget the job of key if no run waits on it, cancelling it if it is still
+# running
+def _drop(key, running):
+    with _LOCK:
+        if running.waiters > 0 or _RUNNING.get(key) is not running:
+            return
+        del _RUNNING[key]
+    if not running.job.is_done():
+        running.job.cancel()
+
+
+# Run a query as a job in slot and return its frame. key identifies the query
+# (its text, params and any pushed down steps): runs needing the same key share
+# one job, and a job left running by a superseded run is picked up again by
+# the next run needing it. A rerun (e.g. a widget change during a load) only
+# detaches this run; the job is cancelled once this session's slot asks for a
+# different key, or when the run is stopped with no other run waiting on it
+# (AsyncJob.cancel issues SYSTEM$CANCEL_QUERY).
+def run_query(slot, result, key):
+    jobs = st.session_state.setdefault(JOBS_KEY, {})
+    previous = jobs.pop(slot, None)
+    if previous is not None and previous[0] != key:
+        _drop(*previous)
+
+    running = _attach(key, result)
+    try:
+        while not running.job.is_done():
+            _sleep(POLL_SECONDS)
+        df = running.job.result("pandas")
+    except RerunException:
+        # Left running for the next run, which asks for it again in this slot
+        _detach(key, running, keep=True)
+        jobs[slot] = (key, running)
+        raise
+    except BaseException:
+        _detach(key, running)
+        raise
+    _detach(key, running)
+    return df
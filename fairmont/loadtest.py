@@ -0,0 +1,351 @@
+import argparse
+import os
+import random
+import re
+import resource
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import timedelta
+from pathlib import Path
+from unittest.mock import MagicMock, patch
+
+import numpy as np
+import pandas as pd
+
+# Load test of the pages: simulated sessions run each page through AppTest
+# against a stub session that serves canned frames after a configurable
+# latency, then script filter interactions and time every rerun. Sessions
+# share one process, and so the shared dataset caches, like the sessions of
+# a deployed app do.
+
+ROOT = Path(__file__).resolve().parent.parent
+START = pd.Timestamp("2023-03-01")
+DAYS = 730
+
+SUBJECTS = [
+    'Get the most out of your time at Fairmont Banff Springs',
+    'Get the most out of your time at Fairmont Banff Springs!',
+    'Personalize My Guest Experience at Fairmont Banff Springs',
+]
+TAGS = ['days:7', 'days:30', 'days:60', '', 'days:']
+DETAILS = ['[]', '[{"ua": "Mozilla Mobile"}]', '[{"ua": "Windows NT"}]', '[{"ua": "Linux"}]', None]
+
+# Option sets every concurrency level is run under, by name, as FAIRMONT_*
+# environment variables. Arrow dtypes with the compressed tier decompress
+# datasets into Arrow-backed columns, which page code must handle as well as
+# the NumPy ones of the default options.
+CONFIGS = {
+    "default": {},
+    "arrow+compressed": {"arrow_dtypes": "on", "cache_tier": "compressed"},
+}
+
+# Realistic values of the source columns the pages filter or branch on.
+# Other columns get random values of their schema type.
+CANNED = {
+    'SOURCE': ['guestportal', 'internal', '', 'fairmontbanff', 'other', None],
+    'NETWORK': ['Fairmont', 'Accor', None],
+    'PRODUCT_CATEGORY': ['Wellness', 'Dining', 'Activities', 'Tours', None],
+    'P_CURRENTSTATUS': ['Confirmed', 'Cancelled', 'Pending', None],
+    'TI_STATUS': ['0', '7', '9', '3', None, ''],
+    'TB_ACTION': ['charge', 'refund', 'other'],
+    'NOTIFICATION_TAG': TAGS + [SUBJECTS[2]],
+    'extra_notification': TAGS,
+    'DATA_SUBJECT': SUBJECTS,
+    'subject_notification': SUBJECTS,
+    'DATA_OPENS_DETAIL': DETAILS,
+    'DATA_CLICKS_DETAIL': DETAILS,
+    'DATA_STATE': ['sent', 'bounced', 'rejected'],
+    'SENT': [0, 1],
+    'OPEN': [0, 1],
+    'CLICKS': [0, 1],
+    'BOOKED_MONTH': [int(month.strftime("%Y%m")) for month in pd.date_range(START, periods=DAYS // 30, freq="MS")],
+    'year_month': [month.strftime("%Y-%m") for month in pd.date_range(START, periods=DAYS // 30, freq="MS")],
+}
+
+
+def _canned_column(col, rows, rng):
+    if col.source in CANNED:
+        values = CANNED[col.source]
+        return pd.Series([values[i] for i in rng.integers(0, len(values), rows)])
+    if col.type == "datetime":
+        return pd.Series(START + pd.to_timedelta(rng.integers(0, DAYS * 86_400, rows), unit="s"))
+    if col.type == "number":
+        return pd.Series(rng.integers(0, 10, rows))
+    return pd.Series([f"{col.label} {i}" for i in rng.integers(0, 12, rows)])
+
+
+# A frame of the given number of rows for a schema, with the columns under
+# the names its query returns them as
+def canned_frame(schema, rows, seed=0):
+    from fairmont.schema import DUPLICATES_COLUMN
+
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({col.label: _canned_column(col, rows, rng) for col in schema.columns})
+    if schema.key is not None:
+        df[DUPLICATES_COLUMN] = 0
+    return df
+
+
+# The sample clause of a sampled dataset query (see select_sql)
+SAMPLE = re.compile(r" SAMPLE ROW \(([\d.]+)\)")
+
+
+# Stands in for Snowpark's AsyncJob, fetching in a background thread
+class StubJob:
+    def __init__(self, stub, query):
+        self.stub = stub
+        self.cancelled = threading.Event()
+        self.frame = None
+        self.thread = threading.Thread(target=self._fetch, args=(query,), daemon=True)
+        self.thread.start()
+
+    def _fetch(self, query):
+        self.frame = self.stub.fetch(query, self.cancelled)
+
+    def is_done(self):
+        return not self.thread.is_alive()
+
+    def result(self, result_type=None):
+        self.thread.join()
+        if self.cancelled.is_set():
+            raise RuntimeError("Query was cancelled")
+        return self.frame
+
+    def cancel(self):
+        if not self.cancelled.is_set():
+            self.cancelled.set()
+            with self.stub.lock:
+                self.stub.cancelled += 1
+
+
+class StubResult:
+    def __init__(self, stub, query):
+        self.stub = stub
+        self.query = query
+
+    def to_pandas(self, block=True):
+        if not block:
+            return StubJob(self.stub, self.query)
+        return self.stub.fetch(self.query)
+
+    def collect(self):
+        return list(self.to_pandas().itertuples(index=False))
+
+
+# Stands in for the Snowpark session: sql(query).to_pandas() returns the
+# canned frame of the registered dataset with that query after sleeping for
+# latency seconds, or submits it as a StubJob with block=False. Dimension
+# catalogs get the distinct rows of their columns of that frame, row counts
+# (count_sql) its length and sampled queries (SAMPLE ROW) each of its rows
+# with the sample's probability. Queries of raw SQL datasets get a small
+# generic frame.
+class StubSession:
+    def __init__(self, rows=5000, latency=0.2):
+        from fairmont.datasets import CATALOGS, DATASETS, catalog_plan
+        from fairmont.queries import canonicalize
+        from fairmont.schema import Schema, count_sql, select_sql
+
+        # By canonical query text, as the app sends them
+        self.latency = latency
+        self.frames = {}
+        for name, (source, _) in DATASETS.items():
+            if isinstance(source, Schema):
+                self.frames[canonicalize(select_sql(source))[0]] = canned_frame(source, rows, seed=len(self.frames))
+                self.frames[canonicalize(count_sql(source))[0]] = pd.DataFrame({'COUNT(*)': [rows]})
+        for name in CATALOGS:
+            query, projection, _ = catalog_plan(name)
+            dataset = self.frames[canonicalize(select_sql(DATASETS[name][0]))[0]]
+            self.frames[canonicalize(query)[0]] = dataset[projection.labels].drop_duplicates()
+        self.lock = threading.Lock()
+        self.queries = 0
+        self.cancelled = 0
+
+    # Bound parameters are ignored, they only hold the literals of the queries
+    def sql(self, query, params=None):
+        return StubResult(self, query)
+
+    # Setting cancelled during the wait abandons the query
+    def fetch(self, query, cancelled=None):
+        with self.lock:
+            self.queries += 1
+        if cancelled is None:
+            time.sleep(self.latency)
+        elif cancelled.wait(self.latency):
+            return None
+        sample = SAMPLE.search(query)
+        df = self.frames.get(SAMPLE.sub("", query))
+        if df is None:
+            return pd.DataFrame({'NAME': ['alpha', 'beta', 'gamma'] * 20, 'COUNT': range(60)})
+        if sample is not None:
+            rng = np.random.default_rng(len(query))
+            return df[rng.random(len(df)) < float(sample.group(1)) / 100].reset_index(drop=True)
+        return df.copy()
+
+
+def _rss_bytes():
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        # Peak rather than current RSS where /proc is not available
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+# Widgets a user would touch: the sidebar filters, the view selectors and
+# search boxes. Widgets showing formatted labels instead of their values
+# (e.g. months) are left alone, since AppTest sets widgets by value.
+def _interactive_widgets(at):
+    widgets = [*at.sidebar.multiselect, *at.sidebar.selectbox, *at.sidebar.date_input, *at.text_input]
+    widgets += [radio for radio in at.radio if radio.key and radio.key.endswith("_view")]
+    return [w for w in widgets if w.type in ("date_input", "text_input") or _shows_values(w)]
+
+
+def _shows_values(widget):
+    try:
+        return all(widget.format_func(option) == option for option in widget.options)
+    except Exception:
+        return False
+
+
+def _interact(widget, rng):
+    if widget.type == "multiselect":
+        count = rng.randint(0, min(2, len(widget.options)))
+        widget.set_value(rng.sample(widget.options, count))
+    elif widget.type in ("selectbox", "radio"):
+        widget.set_value(rng.choice(widget.options))
+    elif widget.type == "date_input":
+        start = (START + timedelta(days=rng.randrange(DAYS))).date()
+        widget.set_value((start, start + timedelta(days=rng.randint(7, 180))))
+    else:
+        widget.set_value(rng.choice(["", "a", "fair", "spa"]))
+
+
+# One simulated user: open each page in a random order and make steps random
+# interactions on it, returning the duration of every rerun in seconds and
+# the errors shown
+def simulate_user(pages, steps, seed, timeout=120):
+    from streamlit.testing.v1 import AppTest
+
+    rng = random.Random(seed)
+    durations, errors = [], []
+    for page in rng.sample(pages, len(pages)):
+        at = AppTest.from_file(str(page), default_timeout=timeout)
+        for step in range(steps + 1):
+            if step:
+                widgets = _interactive_widgets(at)
+                if not widgets:
+                    break
+                _interact(rng.choice(widgets), rng)
+            started = time.perf_counter()
+            try:
+                at.run()
+            except Exception as e:
+                # A failure of AppTest itself rather than the page, count it
+                # and move on to the next page
+                errors.append(f"{page.name}: AppTest failed: {e!r}")
+                break
+            durations.append(time.perf_counter() - started)
+            errors += [f"{page.name}: {e.message}" for e in at.exception] + [f"{page.name}: {e.value}" for e in at.error]
+    return durations, errors
+
+
+# AppTest installs a mock runtime and sets the global.appTest option for each
+# run and undoes both when the run ends, so with runs overlapping in threads a
+# run can find them gone. Fall back to a shared mock runtime and hold the
+# option meanwhile.
+@contextmanager
+def _shared_runtime():
+    from streamlit import runtime
+    from streamlit.runtime.media_file_manager import MediaFileManager
+    from streamlit.runtime.memory_media_file_storage import MemoryMediaFileStorage
+    from streamlit.testing.v1.util import patch_config_options
+
+    shared = MagicMock(spec=runtime.Runtime)
+    shared.media_file_mgr = MediaFileManager(MemoryMediaFileStorage("/mock/media"))
+    with patch.object(runtime, "get_instance", lambda: runtime.Runtime._instance or shared), \
+            patch_config_options({"global.appTest": True}):
+        yield
+
+
+# Set the options of a config (see CONFIGS) for the duration of the block
+@contextmanager
+def _options(options):
+    saved = {name: os.environ.get(f"FAIRMONT_{name.upper()}") for name in options}
+    os.environ.update({f"FAIRMONT_{name.upper()}": value for name, value in options.items()})
+    try:
+        yield
+    finally:
+        for name, value in saved.items():
+            if value is None:
+                os.environ.pop(f"FAIRMONT_{name.upper()}", None)
+            else:
+                os.environ[f"FAIRMONT_{name.upper()}"] = value
+
+
+# Run users concurrent sessions, starting from empty caches. Returns a row of
+# the report and the errors the sessions saw.
+def run_level(stub, pages, users, steps, seed=0):
+    import streamlit as st
+
+    st.cache_resource.clear()
+    st.cache_data.clear()
+    stub.queries = stub.cancelled = 0
+    rss_before = _rss_bytes()
+
+    started = time.perf_counter()
+    with _shared_runtime(), ThreadPoolExecutor(max_workers=users) as pool:
+        results = list(pool.map(lambda user: simulate_user(pages, steps, seed + user), range(users)))
+    elapsed = time.perf_counter() - started
+
+    durations = np.array([d for user_durations, _ in results for d in user_durations]) * 1000
+    errors = [error for _, user_errors in results for error in user_errors]
+    return {
+        "users": users,
+        "reruns": len(durations),
+        "p50 ms": np.percentile(durations, 50),
+        "p95 ms": np.percentile(durations, 95),
+        "p99 ms": np.percentile(durations, 99),
+        "max ms": durations.max(),
+        "reruns/s": len(durations) / elapsed,
+        "RSS MB": _rss_bytes() / 2**20,
+        "RSS growth MB": (_rss_bytes() - rss_before) / 2**20,
+        # Warehouse queries, i.e. dataset cache misses over all sessions
+        "queries": stub.queries,
+        "cancelled": stub.cancelled,
+        "errors": len(errors),
+    }, errors
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load test the pages with simulated concurrent sessions.")
+    parser.add_argument("--users", default="1,2,4,8", help="comma-separated concurrency levels")
+    parser.add_argument("--steps", type=int, default=10, help="interactions per session")
+    parser.add_argument("--latency", type=float, default=0.2, help="seconds the stub waits per query")
+    parser.add_argument("--rows", type=int, default=5000, help="rows of each canned dataset")
+    parser.add_argument("--pages", nargs="*", help="only pages whose file name contains one of these")
+    parser.add_argument("--configs", default=",".join(CONFIGS), help="comma-separated option sets (see CONFIGS)")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    # The stub returns plain frames, so preprocessing runs locally
+    os.environ["FAIRMONT_PUSHDOWN"] = "off"
+
+    from fairmont import session
+
+    stub = StubSession(rows=args.rows, latency=args.latency)
+    session.get_session = lambda: stub
+
+    pages = sorted(p for p in (ROOT / "pages").glob("*.py")
+                   if not args.pages or any(name in p.name for name in args.pages))
+    rows, errors = [], set()
+    for config in args.configs.split(","):
+        with _options(CONFIGS[config]):
+            for users in args.users.split(","):
+                row, level_errors = run_level(stub, pages, int(users), args.steps, args.seed)
+                rows.append({"config": config, **row})
+                errors.update(f"{config}: {error}" for error in level_errors)
+    print(pd.DataFrame(rows).round(1).to_string(index=False))
+    for error in sorted(errors):
+        print(error)
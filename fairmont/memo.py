@@ -0,0 +1,48 @@
+from collections import OrderedDict
+
+import pandas as pd
+import streamlit as st
+
+from fairmont.config import get_option
+from fairmont.store import load_stats
+
+# Results a session computed from a dataset under a filter state, e.g. the
+# filtered view, its aggregated table and grand totals. They are kept in an
+# LRU of the session's memo_size most recent filter states, so going back to
+# a recent combination of filters is a lookup instead of new masks and
+# groupbys. Entries are keyed by the dataset's version, so a reload of the
+# dataset leaves them unused, and they are dropped on the next lookup.
+
+MEMO_KEY = "_filter_memo"
+
+
+def _entry(name, filters, size):
+    memo = st.session_state.setdefault(MEMO_KEY, OrderedDict())
+    version = load_stats().get(name, {}).get("version")
+    for stale in [key for key in memo if key[0] == name and key[1] != version]:
+        del memo[stale]
+
+    key = (name, version, filters.key())
+    if key in memo:
+        memo.move_to_end(key)
+    else:
+        memo[key] = {}
+        while len(memo) > size:
+            memo.popitem(last=False)
+    return memo[key]
+
+
+# Return the part of the results for a dataset's rows under filters, running
+# compute only when this session has not computed it for the same version of
+# the dataset and filter state yet. Frames are returned as shallow copies, so
+# the page may add columns to them without changing the memoized result.
+# A memo_size of 0 turns memoization off.
+def memoized(name, filters, part, compute):
+    size = int(get_option("memo_size", 8))
+    if size < 1:
+        return compute()
+    entry = _entry(name, filters, size)
+    if part not in entry:
+        entry[part] = compute()
+    result = entry[part]
+    return result.copy(deep=False) if isinstance(result, pd.DataFrame) else result
@@ -0,0 +1,48 @@
+import math
+
+import streamlit as st
+
+from fairmont.arrow import check_arrow
+
+PAGE_SIZES = [50, 100, 250, 500]
+
+
+# Sort and slice a frame on the server, returning only the rows of one page
+def get_page(df, page, page_size, sort_by=None, ascending=True):
+    start = (page - 1) * page_size
+    if sort_by is None:
+        return df.iloc[start:start + page_size]
+
+    # Sort just the key column and take the positions for this page,
+    # so the rest of the frame is never reordered or copied
+    order = df[sort_by].reset_index(drop=True).sort_values(
+        ascending=ascending, kind='stable', na_position='last'
+    ).index
+    return df.iloc[order[start:start + page_size]]
+
+
+# Display a frame one page at a time. Only the visible page is serialized
+# to the browser, with sorting done server-side across all rows. Not a
+# fragment itself, since Streamlit 1.35 does not nest them: drawn inside a
+# page's fragment, paging and sorting rerun just that fragment.
+def paged_dataframe(df, key, height=600):
+    total_rows = len(df)
+
+    col1, col2, col3, col4 = st.columns([2, 1, 1, 1])
+    sort_by = col1.selectbox("Sort by", [None, *df.columns], key=f"{key}_sort_by",
+                             format_func=lambda column: "(none)" if column is None else column)
+    ascending = col2.radio("Order", ["Ascending", "Descending"], key=f"{key}_order",
+                           horizontal=True, disabled=sort_by is None) == "Ascending"
+    page_size = col3.selectbox("Rows per page", PAGE_SIZES, index=1, key=f"{key}_page_size")
+
+    page_count = max(1, math.ceil(total_rows / page_size))
+    # Filters may have shrunk the result since the page was chosen
+    if st.session_state.get(f"{key}_page", 1) > page_count:
+        st.session_state[f"{key}_page"] = page_count
+    page = col4.number_input("Page", min_value=1, max_value=page_count, step=1, key=f"{key}_page")
+
+    page_df = check_arrow(get_page(df, page, page_size, sort_by, ascending), f"{key}: display")
+    st.dataframe(page_df, height=height, use_container_width=True)
+
+    first_row = (page - 1) * page_size
+    st.caption(f"Rows {min(first_row + 1, total_rows):,}–{first_row + len(page_df):,} of {total_rows:,}")
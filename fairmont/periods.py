@@ -0,0 +1,35 @@
+import numpy as np
+import pandas as pd
+
+# Months are keyed as YYYYMM integers (e.g. 202403), the format BOOKED_MONTH
+# already has in Snowflake. Keys are derived once at load time with integer
+# arithmetic, so sorting and grouping by month compare small ints rather than
+# strings or timestamps. Convert back to dates or labels only for display.
+MONTH_KEY_DTYPE = "Int32"
+
+
+# YYYYMM key of each date, null where the date is null
+def month_key(dates):
+    return (dates.dt.year * 100 + dates.dt.month).astype(MONTH_KEY_DTYPE)
+
+
+# First day of each YYYYMM key, for plotting on a date axis. Uses only // and
+# subtraction, which Arrow-backed keys support as well as NumPy ones (they do
+# not support %).
+def month_start(keys):
+    years = keys // 100
+    months = (years - 1970) * 12 + (keys - years * 100) - 1
+    # numpy reads the smallest int64 as NaT
+    values = months.to_numpy(dtype="int64", na_value=np.iinfo(np.int64).min)
+    return pd.Series(values.astype("datetime64[M]").astype("datetime64[ns]"), index=keys.index, name=keys.name)
+
+
+# "YYYY-MM" label of a single key
+def format_month(key):
+    return f"{key // 100:04d}-{key % 100:02d}"
+
+
+# "YYYY-MM" labels of a column of keys, formatting each distinct key once
+def month_labels(keys):
+    labels = {key: format_month(key) for key in keys.dropna().unique()}
+    return keys.map(labels).astype("string")
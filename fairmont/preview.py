@@ -0,0 +1,42 @@
+import numpy as np
+
+from fairmont.config import get_option
+
+# Opt-in fast previews (the fast_preview option). While a dataset loads for
+# the first time, charts that only show trends are drawn from a random sample
+# of its rows, with the measures scaled up to estimates of the totals and 95%
+# confidence bounds. Once the full dataset is in, the page renders from it as
+# usual, so the charts are replaced by exact ones and totals and metrics are
+# only ever shown exact.
+
+Z_95 = 1.96
+
+
+def preview_enabled():
+    return get_option("fast_preview", "off") == "on"
+
+
+# Percentage of a table of rows to sample so the preview reads about
+# preview_rows rows, or None when that is most of the table anyway
+def sample_percent(rows):
+    target = int(get_option("preview_rows", 50_000))
+    percent = round(100 * target / rows, 3) if rows else 100
+    return max(percent, 0.001) if percent < 50 else None
+
+
+# Estimated sums of measures per group of keys over all rows, from a sample in
+# which each row was picked with probability fraction. Each measure is scaled
+# by 1 / fraction and gets a "<measure> error" column with the half-width of
+# its 95% confidence interval. Rows with a null key are dropped.
+def estimate_sums(df, keys, measures, fraction):
+    groups = [df[key] for key in keys]
+    sums = df[measures].groupby(groups).sum()
+    squares = (df[measures] ** 2).groupby(groups).sum()
+
+    estimate = sums / fraction
+    error = Z_95 * np.sqrt(squares * (1 - fraction) / fraction ** 2)
+    return estimate.join(error.add_suffix(" error")).reset_index()
+
+
+def estimated_title(title, fraction):
+    return f"{title} (estimated from a {fraction:.2%} sample, with 95% bounds)"
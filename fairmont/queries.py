@@ -0,0 +1,121 @@
+import hashlib
+import re
+import threading
+from decimal import Decimal
+
+import pandas as pd
+import streamlit as st
+
+# Canonical form of the SQL the app sends, so equivalent queries share one
+# entry in the app's caches and in Snowflake's result cache, which only
+# matches identical query text: whitespace and comments are collapsed,
+# unquoted words upper-cased as Snowflake resolves them, and literals lifted
+# into bind parameters. A query's fingerprint hashes its canonical text, so
+# it is the same whatever values its literals have.
+
+_TOKEN = re.compile(r"""
+    (?P<string>'(?:[^']|'')*')
+  | (?P<identifier>"(?:[^"]|"")*")
+  | (?P<comment>--[^\n]*|/\*.*?\*/)
+  | (?P<number>(?<![\w.])\d+(?:\.\d+)?(?:[eE][-+]?\d+)?(?![\w.]))
+  | (?P<word>[A-Za-z_$][\w$]*)
+  | (?P<space>\s+)
+  | (?P<other>.)
+""", re.VERBOSE | re.DOTALL)
+
+# Numbers are only bound where they are compared or computed with. Elsewhere
+# they can be part of the syntax, e.g. SAMPLE ROW (10) or NUMBER(38, 0).
+_BINDS_NUMBER_AFTER = {"=", "<", ">", "+", "-", "*", "/", "BETWEEN", "AND", "OR", "THEN", "ELSE"}
+
+# Strings after these are typed literals, e.g. DATE '2024-01-01' or
+# INTERVAL '1 day', and stay inline: a type keyword cannot take a placeholder
+_TYPED_LITERALS = {"DATE", "TIME", "TIMESTAMP", "TIMESTAMP_LTZ", "TIMESTAMP_NTZ", "TIMESTAMP_TZ", "INTERVAL"}
+
+
+def _number(text):
+    return int(text) if text.isdigit() else Decimal(text)
+
+
+# Return the canonical text of query, with ? for its literals, and the
+# literals' values in order
+def canonicalize(query):
+    parts, params = [], []
+    previous, space = None, False
+    for match in _TOKEN.finditer(query):
+        kind, text = match.lastgroup, match.group()
+        if kind in ("space", "comment"):
+            space = True
+            continue
+        if kind == "string" and previous not in _TYPED_LITERALS:
+            params.append(text[1:-1].replace("''", "'"))
+            text = "?"
+        elif kind == "number" and previous in _BINDS_NUMBER_AFTER:
+            params.append(_number(text))
+            text = "?"
+        elif kind == "word":
+            text = text.upper()
+        if space and parts and parts[-1] != "(" and text not in (")", ","):
+            parts.append(" ")
+        parts.append(text)
+        previous, space = text, False
+    return "".join(parts).rstrip(";").rstrip(), params
+
+
+def fingerprint(text):
+    return hashlib.sha256(text.encode()).hexdigest()[:16]
+
+
+# The session's result for a query, sent in canonical form with its literals
+# bound. params are the canonical params, if the query is canonical already.
+def bind_sql(snowflake_session, query, params=None):
+    if params is None:
+        query, params = canonicalize(query)
+    return snowflake_session.sql(query, params=list(params) or None)
+
+
+# Requests and cache misses of each query by fingerprint, since the caches
+# were last cleared
+@st.cache_resource(show_spinner=False)
+def query_stats():
+    return {"lock": threading.Lock(), "queries": {}}
+
+
+def _count(text, field):
+    stats = query_stats()
+    with stats["lock"]:
+        entry = stats["queries"].setdefault(fingerprint(text), {"query": text, "requests": 0, "misses": 0})
+        entry[field] += 1
+
+
+# A request for a query's result, served from a cache unless a miss follows
+def record_request(text):
+    _count(text, "requests")
+
+
+def record_miss(text):
+    _count(text, "misses")
+
+
+def query_stats_frame():
+    with query_stats()["lock"]:
+        entries = [{"fingerprint": key, **entry} for key, entry in query_stats()["queries"].items()]
+    df = pd.DataFrame(entries, columns=["fingerprint", "query", "requests", "misses"])
+    df["hits"] = (df["requests"] - df["misses"]).clip(lower=0)
+    df["hit rate"] = (df["hits"] / df["requests"].where(df["requests"] > 0)).round(3)
+    return df[["fingerprint", "requests", "hits", "misses", "hit rate", "query"]]
+
+
+if __name__ == "__main__":
+    checks = {
+        "SELECT  a,b\n FROM t -- note\n WHERE x = 'it''s' AND n > 10;":
+            ("SELECT A,B FROM T WHERE X = ? AND N > ?", ["it's", 10]),
+        "select \"Mixed\" from t sample row (2.5) where d between '2024-01-01' and '2024-12-31'":
+            ('SELECT "Mixed" FROM T SAMPLE ROW (2.5) WHERE D BETWEEN ? AND ?', ["2024-01-01", "2024-12-31"]),
+        "SELECT * FROM t WHERE d >= DATE '2024-01-01' AND ts < timestamp '2024-02-01 00:00' + INTERVAL '1 day' AND s = 'x'":
+            ("SELECT * FROM T WHERE D >= DATE '2024-01-01' AND TS < TIMESTAMP '2024-02-01 00:00' + INTERVAL '1 day' AND S = ?",
+             ["x"]),
+    }
+    for query, expected in checks.items():
+        result = canonicalize(query)
+        assert result == expected, f"{query!r}: {result!r} != {expected!r}"
+    print(f"canonicalize: {len(checks)} queries match")
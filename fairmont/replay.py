@@ -0,0 +1,107 @@
+import hashlib
+import json
+import os
+import re
+import threading
+from pathlib import Path
+
+# Sessions that stand in for the Snowpark session locally. A recording
+# session passes queries through to the warehouse and saves each result set
+# to Parquet, keyed by its normalized SQL; a replay session serves the saved
+# results through DuckDB without a warehouse connection. Both support the
+# sql(query, params).to_pandas() and collect() calls the app makes.
+
+
+# Collapse whitespace so formatting changes to a query keep its recording
+def normalize_sql(query):
+    return re.sub(r"\s+", " ", query).strip().rstrip(";").strip()
+
+
+# Bound parameters are part of the key, queries without any keep the key of
+# their text alone
+def query_key(query, params=None):
+    text = normalize_sql(query)
+    if params:
+        text += "\n" + json.dumps(list(params), default=str)
+    return hashlib.sha256(text.encode()).hexdigest()[:16]
+
+
+# Rows as Snowpark returns them from collect()
+def _rows(df):
+    from snowflake.snowpark import Row
+
+    return [Row(**record) for record in df.to_dict("records")]
+
+
+class RecordedResult:
+    def __init__(self, result, path):
+        self.result = result
+        self.path = path
+
+    def to_pandas(self):
+        df = self.result.to_pandas()
+        # Write next to the target and rename, so concurrent readers never see
+        # a partial file
+        partial = self.path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.partial")
+        df.to_parquet(partial, index=False)
+        os.replace(partial, self.path)
+        return df
+
+    def collect(self):
+        return _rows(self.to_pandas())
+
+
+class RecordingSession:
+    def __init__(self, session, directory):
+        self.session = session
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+    def sql(self, query, params=None):
+        key = query_key(query, params)
+        # The query itself is kept alongside for reference
+        text = normalize_sql(query) + "\n" + (f"-- params: {json.dumps(list(params), default=str)}\n" if params else "")
+        (self.directory / f"{key}.sql").write_text(text)
+        return RecordedResult(self.session.sql(query, params=params), self.directory / f"{key}.parquet")
+
+
+class ReplayedResult:
+    def __init__(self, session, query, params=None):
+        self.session = session
+        self.query = query
+        self.params = params
+
+    def to_pandas(self):
+        return self.session.read(self.query, self.params)
+
+    def collect(self):
+        return _rows(self.to_pandas())
+
+
+class ReplaySession:
+    def __init__(self, directory):
+        try:
+            import duckdb
+        except ImportError as e:
+            raise ImportError("Replaying recorded queries requires the duckdb package") from e
+
+        self.directory = Path(directory)
+        self.connection = duckdb.connect()
+        # Keep timestamps with a time zone in UTC, as they were recorded
+        self.connection.execute("SET TimeZone = 'UTC'")
+
+    def sql(self, query, params=None):
+        return ReplayedResult(self, query, params)
+
+    def read(self, query, params=None):
+        path = self.directory / f"{query_key(query, params)}.parquet"
+        if not path.exists():
+            raise FileNotFoundError(
+                f"No recording of this query in {self.directory}, run once with session_mode=record: {normalize_sql(query)[:200]}"
+            )
+        # A cursor per read, as one DuckDB connection is not shared between threads
+        cursor = self.connection.cursor()
+        try:
+            return cursor.execute("SELECT * FROM read_parquet(?)", [str(path)]).df()
+        finally:
+            cursor.close()
@@ -0,0 +1,135 @@
+from dataclasses import dataclass
+
+import pandas as pd
+
+
+class SchemaError(Exception):
+    pass
+
+
+# Schema key comparing every column of a source row, not only the selected
+# ones, through its 64-bit HASH(*). Rows count as duplicates only when they
+# are identical, as with drop_duplicates() on the whole row.
+ROW_KEY = "*"
+
+# Column holding the source row's hash in the inner query of a keyed schema
+ROW_HASH_COLUMN = "_row_hash"
+
+# Column added by select_sql to keyed queries, counting the duplicates each
+# returned row stood for. The store removes it after loading.
+DUPLICATES_COLUMN = "_duplicates"
+
+
+# A source column a page needs, with its expected type ("str", "number" or
+# "datetime") and the display name it is renamed to after loading
+@dataclass(frozen=True)
+class Column:
+    source: str
+    type: str = "str"
+    name: str = None
+
+    @property
+    def label(self):
+        return self.name or self.source
+
+
+# The columns a page reads from one Snowflake table. Only these columns are
+# selected, so everything else is never transferred or held in memory.
+# key declares what makes a source row unique: a tuple of source columns (the
+# business key) or ROW_KEY to compare whole rows. Duplicates are dropped in the
+# warehouse, keeping one row per key.
+@dataclass(frozen=True)
+class Schema:
+    table: str
+    columns: tuple
+    where: str = None
+    key: tuple = None
+
+    def __post_init__(self):
+        object.__setattr__(self, "columns", tuple(self.columns))
+        if self.key is not None and self.key != ROW_KEY:
+            object.__setattr__(self, "key", tuple(self.key))
+            missing = set(self.key) - {col.source for col in self.columns}
+            if missing:
+                raise SchemaError(f"{self.table} key columns are not selected: {', '.join(sorted(missing))}")
+
+    @property
+    def labels(self):
+        return [col.label for col in self.columns]
+
+
+def quote_identifier(name):
+    return '"' + name.replace('"', '""') + '"'
+
+
+def _select_item(col):
+    if col.name:
+        return f"{quote_identifier(col.source)} AS {quote_identifier(col.name)}"
+    return quote_identifier(col.source)
+
+
+# Generate the projected SELECT for a schema, renaming columns in the query.
+# A keyed schema is deduplicated with QUALIFY, partitioning on the key columns,
+# or for ROW_KEY on the HASH(*) of the source row, computed once per row in a
+# subquery, so no row is compared cell by cell. The row with the lowest hash
+# of each key is kept, so a business key keeps the same row on every load.
+# Passing sample reads only that percentage of the table's rows, each row
+# picked independently with that probability.
+def select_sql(schema, sample=None):
+    items = [_select_item(col) for col in schema.columns]
+    if schema.key is not None:
+        items.append(f"HASH(*) AS {quote_identifier(ROW_HASH_COLUMN)}")
+    sql = f"SELECT {', '.join(items)} FROM {schema.table}"
+    if sample is not None:
+        sql += f" SAMPLE ROW ({sample:g})"
+    if schema.where:
+        sql += f" WHERE {schema.where}"
+    if schema.key is None:
+        return sql
+
+    row_hash = quote_identifier(ROW_HASH_COLUMN)
+    if schema.key == ROW_KEY:
+        partition = row_hash
+    else:
+        labels = {col.source: col.label for col in schema.columns}
+        partition = ", ".join(quote_identifier(labels[k]) for k in schema.key)
+    columns = ", ".join(quote_identifier(label) for label in schema.labels)
+    return (f"SELECT {columns}, COUNT(*) OVER (PARTITION BY {partition}) - 1 AS {quote_identifier(DUPLICATES_COLUMN)} "
+            f"FROM ({sql}) QUALIFY ROW_NUMBER() OVER (PARTITION BY {partition} ORDER BY {row_hash}) = 1")
+
+
+# Count the rows of a schema's table, before any deduplication
+def count_sql(schema):
+    sql = f"SELECT COUNT(*) FROM {schema.table}"
+    if schema.where:
+        sql += f" WHERE {schema.where}"
+    return sql
+
+
+# Generate a SELECT of the distinct rows of a schema's columns, renamed as in
+# select_sql. Duplicates need no key here, they collapse anyway.
+def distinct_sql(schema):
+    columns = ", ".join(_select_item(col) for col in schema.columns)
+    sql = f"SELECT DISTINCT {columns} FROM {schema.table}"
+    if schema.where:
+        sql += f" WHERE {schema.where}"
+    return sql
+
+
+# Check a fetched frame against its schema and coerce the declared types.
+# Raises SchemaError up front instead of a KeyError mid-render.
+def apply_schema(df, schema):
+    missing = [col.source for col in schema.columns if col.label not in df.columns]
+    if missing:
+        raise SchemaError(f"{schema.table} is missing expected columns: {', '.join(missing)}")
+
+    for col in schema.columns:
+        series = df[col.label]
+        try:
+            if col.type == "number" and not pd.api.types.is_numeric_dtype(series):
+                df[col.label] = pd.to_numeric(series)
+            elif col.type == "datetime" and not pd.api.types.is_datetime64_any_dtype(series):
+                df[col.label] = pd.to_datetime(series)
+        except (TypeError, ValueError) as e:
+            raise SchemaError(f"{schema.table}.{col.source} is not a valid {col.type} column: {e}") from e
+    return df
@@ -0,0 +1,46 @@
+import streamlit as st
+
+from fairmont.config import get_option
+from fairmont.replay import RecordingSession, ReplaySession
+
+
+# Connect to Snowflake, through the active session inside Snowflake or the
+# credentials in st.secrets otherwise. Snowpark is slow to import, so it is
+# only imported once a live session is needed.
+def _live_session():
+    from snowflake.snowpark import Session
+    from snowflake.snowpark.context import get_active_session
+
+    try:
+        return get_active_session()
+    except:
+        pars = {
+            "account": st.secrets["snowflake"]["account"],
+            "user": st.secrets["snowflake"]["user"],
+            "password": st.secrets["snowflake"]["password"],
+            "warehouse": st.secrets["snowflake"]["warehouse"],
+            "role": st.secrets["snowflake"]["role"],
+            "database": st.secrets["snowflake"]["database"],
+            "client_session_keep_alive": True
+        }
+        return Session.builder.configs(pars).create()
+
+
+# Define a function to get a Snowflake session. The session_mode option can
+# instead record the live session's results to recordings_dir, or replay
+# them from there without connecting at all.
+@st.cache_resource
+def get_session():
+    mode = get_option("session_mode", "live")
+    directory = get_option("recordings_dir", ".recordings")
+    if mode == "replay":
+        return ReplaySession(directory)
+    if mode == "record":
+        return RecordingSession(_live_session(), directory)
+    return _live_session()
+
+
+# Whether the session builds Snowpark plans, so pushdown steps can run in the
+# warehouse. Recording and replay sessions serve plain frames.
+def is_live():
+    return get_option("session_mode", "live") == "live"
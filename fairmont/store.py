@@ -0,0 +1,159 @@
+import threading
+import time
+
+import pandas as pd
+import streamlit as st
+
+from fairmont import session
+from fairmont.arrow import arrow_enabled, to_arrow
+from fairmont.compression import compress_frame, drop_hot_frames, get_hot_frame
+from fairmont.config import get_option
+from fairmont.jobs import run_query
+from fairmont.pipeline import Pipeline
+from fairmont.queries import bind_sql, canonicalize, record_miss, record_request
+from fairmont.schema import DUPLICATES_COLUMN, Schema, apply_schema, select_sql
+
+# Copy-on-write lets every rerun take a shallow copy of a shared frame.
+# Columns are only copied when a page actually modifies them.
+pd.set_option("mode.copy_on_write", True)
+
+
+# Row and duplicate counts of each loaded dataset, by name, with a version
+# that changes whenever the dataset is reloaded. Cleared together with the
+# datasets themselves.
+@st.cache_resource
+def load_stats():
+    return {}
+
+
+# Run a dataset's query and build its frame, for load_dataset and load_sample
+def _load(name, query, params, pushdown, schema):
+    snowflake_session = session.get_session()
+    if snowflake_session is None:
+        raise RuntimeError("Session is not initialized.")
+    record_miss(query)
+
+    # Execute query and fetch results, as a job the session can cancel
+    snow_df = bind_sql(snowflake_session, query, params)
+    if pushdown and get_option("pushdown", "on") == "on" and session.is_live():
+        steps = Pipeline(pushdown)
+        df = run_query(name, steps.run(snow_df, engine="snowpark"), (query, params, steps.key()))
+    else:
+        df = run_query(name, snow_df, (query, params))
+        if pushdown:
+            df = Pipeline(pushdown).run(df)
+
+    # Keyed schemas count the duplicates dropped in the warehouse per row
+    duplicates = 0
+    if DUPLICATES_COLUMN in df.columns:
+        duplicates = int(df[DUPLICATES_COLUMN].sum())
+        df = df.drop(columns=DUPLICATES_COLUMN)
+    load_stats()[name] = {"rows": len(df), "duplicates": duplicates, "version": time.time_ns()}
+
+    if schema is not None:
+        df = apply_schema(df, schema)
+    if arrow_enabled():
+        df = to_arrow(df)
+
+    if get_option("cache_tier", "memory") == "compressed":
+        return compress_frame(df)
+    return df
+
+
+# Load a dataset once per process and share it between all sessions.
+# Unlike st.cache_data nothing is pickled or deep-copied on access, so the
+# frame returned here must be treated as read-only: derived columns belong in
+# a derived view (see fairmont.datasets.get_view), computed once per load.
+# With the "compressed" cache tier the frame is held as a compressed
+# Arrow IPC buffer instead and decompressed on access (see get_dataset).
+# Pushdown steps are built onto the query as a lazy Snowpark plan and run in
+# the warehouse, so only the finished frame is transferred.
+# With the arrow_dtypes option the frame is converted to Arrow dtypes here,
+# once.
+# If the run that started the load is superseded before the query finishes
+# (e.g. by a filter change), the query keeps running and the next run needing
+# it picks it up (see run_query). It is cancelled if the run is stopped.
+# The query is in canonical form (see fairmont.queries), with its literals in
+# params, so formatting and literal values do not split the cache.
+@st.cache_resource(show_spinner="Loading data...")
+def load_dataset(name, query, params=(), pushdown=(), _schema=None):
+    return _load(name, query, params, pushdown, _schema)
+
+
+# Seconds a sample loaded for a fast preview is kept at most
+PREVIEW_TTL = float(get_option("preview_ttl", 600))
+
+# The samples loaded for each dataset, by its name, as the arguments they were
+# loaded with, so they can be dropped once the dataset itself is loaded
+_SAMPLES = {}
+_SAMPLES_LOCK = threading.Lock()
+
+
+# Load a sample of a dataset for a fast preview (see fairmont.preview) like
+# load_dataset, in a cache of its own. A sample is only needed until the full
+# dataset loads, so it is dropped then (see drop_samples) and expires after
+# preview_ttl seconds in any case.
+@st.cache_resource(ttl=PREVIEW_TTL, show_spinner=False)
+def load_sample(name, query, params=(), pushdown=(), _schema=None):
+    return _load(name, query, params, pushdown, _schema)
+
+
+# Drop the samples loaded for the dataset name
+def drop_samples(name):
+    with _SAMPLES_LOCK:
+        samples = _SAMPLES.pop(name, {})
+    for sample_name, (query, params, pushdown) in samples.items():
+        load_sample.clear(sample_name, query, params, pushdown)
+        load_stats().pop(sample_name, None)
+        drop_hot_frames(sample_name)
+
+
+# Whether a dataset is loaded already, so reading it will not wait on the
+# warehouse
+def is_loaded(name):
+    return name in load_stats()
+
+
+@st.cache_resource(show_spinner=False)
+def _count_rows(query, params):
+    record_miss(query)
+    return int(run_query(query, bind_sql(session.get_session(), query, params), (query, params)).iloc[0, 0])
+
+
+# Row count of a query returning one, e.g. count_sql, cached like a dataset
+def count_rows(query):
+    query, params = canonicalize(query)
+    record_request(query)
+    return _count_rows(query, tuple(params))
+
+
+# Return a shallow, copy-on-write view of a shared dataset, or None on failure.
+# Failures are reported here rather than inside load_dataset so they are not cached.
+# The source is either a Schema, queried with a projected SELECT, or raw SQL.
+# pushdown is a Pipeline of preprocessing steps to run in the warehouse.
+# Passing columns limits the view (and any
+# decompression) to those columns. Passing sample loads only that percentage
+# of a Schema's rows (see select_sql), as the sample "<name>@<sample>%" held
+# until drop_samples(name).
+def get_dataset(name, source, columns=None, pushdown=None, sample=None):
+    schema = source if isinstance(source, Schema) else None
+    query, params = canonicalize(select_sql(schema, sample) if schema is not None else source)
+    steps = pushdown.steps if pushdown is not None else ()
+    record_request(query)
+    try:
+        if sample is None:
+            data = load_dataset(name, query, tuple(params), steps, schema)
+        else:
+            sample_name = f"{name}@{sample:g}%"
+            with _SAMPLES_LOCK:
+                _SAMPLES.setdefault(name, {})[sample_name] = (query, tuple(params), steps)
+            data = load_sample(sample_name, query, tuple(params), steps, schema)
+            name = sample_name
+        if isinstance(data, pd.DataFrame):
+            df = data if columns is None else data[list(columns)]
+        else:
+            df = get_hot_frame(name, data, columns)
+    except Exception as e:
+        st.error(f"Failed to execute query or process data: {str(e)}")
+        return None
+    return df.copy(deep=False)
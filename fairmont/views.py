@@ -0,0 +1,10 @@
+import streamlit as st
+
+
+# Render a view selector in place of st.tabs. st.tabs runs every tab body on
+# each rerun; here the page only computes the view that is selected.
+# Pages draw the selector and its views in an st.experimental_fragment taking
+# the filtered frame and filters, so switching views or using their widgets
+# reruns only the views rather than the whole page.
+def view_selector(labels, key):
+    return st.radio("View", labels, key=key, horizontal=True, label_visibility="collapsed")
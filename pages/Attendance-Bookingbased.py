@@ -1,87 +1,28 @@
 import streamlit as st
-from snowflake.snowpark import Session
-import plotly.express as px
 import pandas as pd
-from snowflake.snowpark.context import get_active_session
-import os
-import configparser
+from fairmont.charts import ATTENDANCE_MEASURES, attendance_chart_data, attendance_charts, attendance_preview
+from fairmont.cube import build_cube
+from fairmont.datasets import duplicates_caption, get_base, get_catalog, get_view
+from fairmont.display import convert_df_to_csv, grand_total_row, grand_total_table
+from fairmont.exports import export_button
+from fairmont.memo import memoized
+from fairmont.pipeline import Pipeline
+from fairmont.paging import paged_dataframe
+from fairmont.periods import month_key
+from fairmont.views import view_selector
 
 st.set_page_config(layout="wide")
 st.title("Attendance - Booked Analysis")
 
-# Define a function to get a Snowflake session
-@st.cache_resource
-def get_session():
-    try:
-        return get_active_session()
-    except:
-        pars = {
-            "account": st.secrets["snowflake"]["account"],
-            "user": st.secrets["snowflake"]["user"],
-            "password": st.secrets["snowflake"]["password"],
-            "warehouse": st.secrets["snowflake"]["warehouse"],
-            "role": st.secrets["snowflake"]["role"],
-            "database": st.secrets["snowflake"]["database"],
-            "client_session_keep_alive": True
-        }
-        return Session.builder.configs(pars).create()
-
-# Define a function to execute a query and return a DataFrame
-@st.cache_data
-def get_dataframe(query):
-    session = get_session()
-    if session is None:
-        st.error("Session is not initialized.")
-        return None
-    try:
-        # Execute query and fetch results
-        snow_df = session.sql(query).to_pandas()
-
-        # Perform preprocessing on Snowflake using Snowpark DataFrame operations
-        snow_df = snow_df.drop_duplicates()
-
-        # Replace nulls in specific columns with 'Unknown'
-        snow_df['NETWORK'] = snow_df['NETWORK'].fillna('Unknown')
-        snow_df['PRODUCT_CATEGORY'] = snow_df['PRODUCT_CATEGORY'].fillna('Unknown')
-        snow_df['SOURCE'] = snow_df['SOURCE'].fillna('Unknown')
-        snow_df['P_VENUENAME'] = snow_df['P_VENUENAME'].fillna('Unknown')
-        snow_df['P_CURRENTSTATUS'] = snow_df['P_CURRENTSTATUS'].fillna('Unknown')
-        snow_df['B_ITEMNAME'] = snow_df['B_ITEMNAME'].fillna('Unknown')
-
-        # Rename columns
-        snow_df.rename(columns={
-            'B_ITEMNAME': 'Item',
-            'PRODUCT_CATEGORY': 'Department',
-            'GUESTS': 'Net Attendance',
-            'B_VALUE': 'Net Value',
-            'ADDED_PRICE': 'ValueAdded',
-            'SOURCE': 'Source',
-            'P_CALDATE': 'Event Date',
-            'NETWORK': 'Network',
-            'P_VENUENAME': 'Venue',
-            'P_CURRENTSTATUS': 'Booking Status'
-        }, inplace=True)
-        
-        # Define the list of sources to keep
-        sources_to_keep = ['guestportal', 'internal', '', 'fairmontbanff']
-
-        # Filter the DataFrame to keep only the rows where 'Source' is in the specified list
-        snow_df = snow_df[snow_df['Source'].isin(sources_to_keep)]
-
-        # Convert Event Date' to datetime
-        snow_df['Event Date'] = pd.to_datetime(snow_df['Event Date'], format='%Y-%m-%d')
-
-
-        # Handle Value column with ValueAdded
-        snow_df['Net Value'] = snow_df.apply(
-            lambda row: row['ValueAdded'] if pd.isna(row['Net Value']) or row['Net Value'] == 0 else row['Net Value'],
-            axis=1
-        )
+# Cube of the bookings over every filter dimension, computed once per load.
+# Filters, aggregated tables and charts read the cube, only the detail table
+# reads the bookings themselves.
+def build_bookings_cube(snow_df):
+    # Derive the reporting month once instead of on every rerun, as a YYYYMM key
+    snow_df['Month'] = month_key(snow_df['Event Date'])
 
-        return snow_df
-    except Exception as e:
-        st.error(f"Failed to execute query or process data: {str(e)}")
-        return None
+    dimensions = ['Event Date', 'Month', 'Source', 'Network', 'Department', 'Venue', 'Item', 'Booking Status']
+    return build_cube(snow_df, dimensions, ATTENDANCE_MEASURES)
 
 # Clear cache button
 if st.button("Clear Cache"):
@@ -89,134 +30,134 @@ if st.button("Clear Cache"):
     st.cache_resource.clear()
     st.experimental_rerun()
     
-# Function to convert DataFrame to CSV
-def convert_df_to_csv(df):
-    return df.to_csv(index=False).encode('utf-8')
-
-# SQL query with fully qualified table name
-query = """
-    SELECT 
-        *
-    FROM 
-        SALES_ANALYTICS.PUBLIC.FAIRMONT_UVE_BOOKINGS_GROUPED
-    """
-
-# Use the function to retrieve data
-df = get_dataframe(query)
-
-# Check if df is not None before applying filters
-if df is not None:
-    # Interactive filters
+# Interactive filters, drawn from the catalog of the bookings' dimensions so
+# they show before the bookings themselves load
+catalog = get_catalog("bookings")
+df = None
+if catalog is not None:
     st.sidebar.header("Filters")
+    # The filters as pipeline steps, for the cube and the detail table
+    filters = Pipeline()
 
     date_range = st.sidebar.date_input("Select Event Date Range", [])
     
     if len(date_range) == 2:
-            df = df[(df['Event Date'] >= pd.to_datetime(date_range[0])) & (df['Event Date'] <= pd.to_datetime(date_range[1]))]
+            filters = filters.filter_between('Event Date', pd.to_datetime(date_range[0]), pd.to_datetime(date_range[1]))
 
-    selected_source = st.sidebar.multiselect("Select Source", df['Source'].unique())
+    # Each filter only offers the values left by the filters above it
+    selected_source = st.sidebar.multiselect("Select Source", catalog['Source'].unique())
     if selected_source:
-        df = df[df['Source'].isin(selected_source)]
+        filters = filters.filter_in('Source', selected_source)
+        catalog = catalog[catalog['Source'].isin(selected_source)]
 
-    selected_network = st.sidebar.multiselect("Select Network", df['Network'].unique())
+    selected_network = st.sidebar.multiselect("Select Network", catalog['Network'].unique())
     if selected_network:
-        df = df[df['Network'].isin(selected_network)]
+        filters = filters.filter_in('Network', selected_network)
+        catalog = catalog[catalog['Network'].isin(selected_network)]
 
-    selected_department = st.sidebar.multiselect("Select Department", df['Department'].unique())
+    selected_department = st.sidebar.multiselect("Select Department", catalog['Department'].unique())
     if selected_department:
-        df = df[df['Department'].isin(selected_department)]
+        filters = filters.filter_in('Department', selected_department)
+        catalog = catalog[catalog['Department'].isin(selected_department)]
 
-    selected_venue = st.sidebar.multiselect("Select Venue", df['Venue'].unique())
+    selected_venue = st.sidebar.multiselect("Select Venue", catalog['Venue'].unique())
     if selected_venue:
-        df = df[df['Venue'].isin(selected_venue)]
+        filters = filters.filter_in('Venue', selected_venue)
+        catalog = catalog[catalog['Venue'].isin(selected_venue)]
 
-    selected_item = st.sidebar.multiselect("Select Item", df['Item'].unique())
+    selected_item = st.sidebar.multiselect("Select Item", catalog['Item'].unique())
     if selected_item:
-        df = df[df['Item'].isin(selected_item)]
+        filters = filters.filter_in('Item', selected_item)
+        catalog = catalog[catalog['Item'].isin(selected_item)]
 
-    selected_booking_status = st.sidebar.multiselect("Select Booking Status", df['Booking Status'].unique())
+    selected_booking_status = st.sidebar.multiselect("Select Booking Status", catalog['Booking Status'].unique())
     if selected_booking_status:
-        df = df[df['Booking Status'].isin(selected_booking_status)]
+        filters = filters.filter_in('Booking Status', selected_booking_status)
 
-    # Group by month and create plot
-    df['Month'] = pd.to_datetime(df['Event Date']).dt.to_period('M').dt.to_timestamp()
+    # Charts estimated from a sample while the bookings first load
+    preview = attendance_preview("bookings", filters, 'Event Date', ['Event Date'])
 
-    chart_data_attendance = df.groupby(['Month', 'Item']).agg({'Net Attendance': 'sum'}).reset_index()
-    chart_data_value = df.groupby(['Month', 'Item']).agg({'Net Value': 'sum'}).reset_index()
+    # Use the function to retrieve data
+    df = get_view("bookings_cube", "bookings", build_bookings_cube)
+    preview.empty()
 
-    aggregated_tab, chart_tab = st.tabs(["Aggregated Tabular Data", "Charts"])
+# Check if df is not None before applying filters
+if df is not None:
+    duplicates_caption("bookings")
 
-    with aggregated_tab:
-        st.write("Aggregated Tabular Data")
-        aggregated_df = df.groupby(['Item', 'Department']).agg({'Net Attendance': 'sum', 'Net Value': 'sum'}).reset_index()
+    # The filters run on the cube with the configured compute engine. This and
+    # the tables and charts below are memoized for the session's recent filter
+    # states.
+    df = memoized("bookings", filters, "view", lambda: filters.run(df))
 
-        # Calculate grand total row for aggregated data
-        grand_total_aggregated = aggregated_df.select_dtypes(include=['number']).sum().to_frame().T
-        grand_total_aggregated.index = ['Grand Total']
+    @st.experimental_fragment
+    def show_views(df, filters):
+        view = view_selector(["Aggregated Tabular Data", "Charts"], key="bookings_view")
 
-        # Round values to 2 decimal places
-        grand_total_aggregated = grand_total_aggregated.round(2)
+        if view == "Aggregated Tabular Data":
+            st.write("Aggregated Tabular Data")
+            aggregated_df = memoized("bookings", filters, "aggregated", lambda: (
+                Pipeline().group_sum(['Item', 'Department'], ['Net Attendance', 'Net Value']).run(df)))
 
-        # Format values to two decimal places as strings
-        grand_total_aggregated = grand_total_aggregated.applymap(lambda x: f'{x:.2f}')
+            # Calculate grand total row for aggregated data, rounded to 2 decimal places
+            grand_total_aggregated = memoized("bookings", filters, "aggregated totals",
+                                              lambda: grand_total_row(aggregated_df, ATTENDANCE_MEASURES))
         
-        st.dataframe(aggregated_df, height=600, use_container_width=True)
+            st.dataframe(aggregated_df, height=600, use_container_width=True)
 
-        st.write("Grand Total")
-        grand_total_aggregated_style = grand_total_aggregated.style.set_properties(
-            **{'text-align': 'left', 'white-space': 'nowrap', 'overflow': 'hidden', 'text-overflow': 'ellipsis'}
-        )
-        st.write(grand_total_aggregated_style.to_html(), unsafe_allow_html=True)
+            st.write("Grand Total")
+            grand_total_table(grand_total_aggregated)
 
-        st.markdown("<br>", unsafe_allow_html=True)  # Add space above the download button
+            st.markdown("<br>", unsafe_allow_html=True)  # Add space above the download button
 
-        # Allow CSV download for aggregated data
-        aggregated_df_with_total = pd.concat([aggregated_df, grand_total_aggregated])
-        csv_data_aggregated = convert_df_to_csv(aggregated_df_with_total)
-        st.download_button(label="Download Aggregated Data as CSV", data=csv_data_aggregated, file_name='aggregated_data.csv', mime='text/csv')
+            # Allow CSV download for aggregated data
+            csv_data_aggregated = memoized("bookings", filters, "aggregated csv", lambda: (
+                convert_df_to_csv(pd.concat([aggregated_df, grand_total_aggregated]))))
+            st.download_button(label="Download Aggregated Data as CSV", data=csv_data_aggregated, file_name='aggregated_data.csv', mime='text/csv')
    
-        st.write("Attendance - Booked Data")
-        renamed_columns = [
-            'Event Date', 'Item', 'Venue', 'Department', 'Source',
-            'Network', 'Booking Status', 'Net Attendance', 'Net Value'
-        ]
-        filtered_df = df[renamed_columns]
-
-        # Calculate grand total row dynamically
-        grand_total = filtered_df.select_dtypes(include=['number']).sum().to_frame().T
-        grand_total.index = ['Grand Total']
-
-        # Round values to 2 decimal places
-        grand_total = grand_total.round(2)
-
-        # Format values to two decimal places as strings
-        grand_total = grand_total.applymap(lambda x: f'{x:.2f}')
-        
-        # Display data without grand total row in full height
-        st.dataframe(filtered_df, height=600, use_container_width=True)  
-
-        # Display grand total row separately with fixed column widths
-        st.write("Grand Total")
-        grand_total_style = grand_total.style.set_properties(
-            **{'text-align': 'left', 'white-space': 'nowrap', 'overflow': 'hidden', 'text-overflow': 'ellipsis'}
-        )
-        st.write(grand_total_style.to_html(), unsafe_allow_html=True)
-
-        st.markdown("<br>", unsafe_allow_html=True)  # Add space above the download button
-
-        # Allow CSV download
-        filtered_df_with_total = pd.concat([filtered_df, grand_total])
-        csv_data = convert_df_to_csv(filtered_df_with_total)
-        st.download_button(label="Download Attendance vs Booked Data as CSV", data=csv_data, file_name='attendance_vs_booked_data.csv', mime='text/csv')
-
-    with chart_tab:
-        fig_attendance = px.line(chart_data_attendance, x='Month', y='Net Attendance', color='Item', title='Attendance Over Time',
-                                 labels={'Month': 'Date', 'Net Attendance': 'Net Attendance'}, markers=True)
-        st.plotly_chart(fig_attendance, use_container_width=True)
+            st.write("Attendance - Booked Data")
+            renamed_columns = [
+                'Event Date', 'Item', 'Venue', 'Department', 'Source',
+                'Network', 'Booking Status', 'Net Attendance', 'Net Value'
+            ]
+            # The rows themselves are not memoized, they would hold a copy of
+            # the bookings per filter state. A failed load is reported by
+            # get_base, the rest of the view needs the rows.
+            bookings = get_base("bookings", columns=renamed_columns)
+            if bookings is None:
+                st.stop()
+            filtered_df = filters.run(bookings)
+
+            # Calculate grand total row dynamically
+            grand_total = grand_total_row(filtered_df, ATTENDANCE_MEASURES)
         
-        fig_value = px.line(chart_data_value, x='Month', y='Net Value', color='Item', title='Net Value Over Time',
-                            labels={'Month': 'Date', 'Net Value': 'Net Value'}, markers=True)
-        st.plotly_chart(fig_value, use_container_width=True)
+            # Display data without grand total row, one page at a time
+            paged_dataframe(filtered_df, key="bookings_rows")
+
+            # Display grand total row separately
+            st.write("Grand Total")
+            grand_total_table(grand_total)
+
+            st.markdown("<br>", unsafe_allow_html=True)  # Add space above the download button
+
+            # Allow CSV download, exported in the background rather than
+            # written on every rerun, and offered once the file is ready.
+            # Like the table, with the grand total row last.
+            export_button("bookings_export", "bookings", renamed_columns, filters,
+                          file_name='attendance_vs_booked_data.csv.gz',
+                          label="Export Attendance vs Booked Data as CSV",
+                          totals=lambda totals: grand_total_row(totals, ATTENDANCE_MEASURES))
+
+        else:
+            # Group by month and create plot
+            chart_data_attendance = memoized("bookings", filters, "chart attendance",
+                                             lambda: attendance_chart_data(df, 'Month', 'Net Attendance'))
+            chart_data_value = memoized("bookings", filters, "chart value",
+                                        lambda: attendance_chart_data(df, 'Month', 'Net Value'))
+            attendance_charts(chart_data_attendance, chart_data_value)
+
+
+    show_views(df, filters)
 
 else:
     st.error("Failed to retrieve data.")
@@ -1,75 +1,36 @@
 import streamlit as st
-from snowflake.snowpark import Session
-import pandas as pd
-from snowflake.snowpark.context import get_active_session
-import os
-import configparser
+from fairmont.datasets import get_base
+from fairmont.paging import paged_dataframe
 
 st.set_page_config(layout="wide")
 st.title("Fairmont Email Analysis")
 
-# Define a function to get a Snowflake session
-@st.cache_resource
-def get_session():
-    try:
-        return get_active_session()
-    except:
-        pars = {
-            "account": st.secrets["snowflake"]["account"],
-            "user": st.secrets["snowflake"]["user"],
-            "password": st.secrets["snowflake"]["password"],
-            "warehouse": st.secrets["snowflake"]["warehouse"],
-            "role": st.secrets["snowflake"]["role"],
-            "database": st.secrets["snowflake"]["database"],
-            "client_session_keep_alive": True
-        }
-        return Session.builder.configs(pars).create()
-
-# Define a function to execute a query and return a DataFrame
-@st.cache_data
-def get_dataframe(query):
-    session = get_session()
-    if session is None:
-        st.error("Session is not initialized.")
-        return None
-    try:
-        # Execute query and fetch results
-        snow_df = session.sql(query).collect()
-        pandas_df = pd.DataFrame(snow_df)
-        return pandas_df
-    except Exception as e:
-        st.error(f"Failed to execute query or process data: {str(e)}")
-        return None
-
 # Clear cache button
 if st.button("Clear Cache"):
     st.cache_data.clear()
     st.cache_resource.clear()
     st.experimental_rerun()
 
-# SQL query
-query = """
-    SELECT 
-        *
-    FROM 
-        SALES_ANALYTICS.PUBLIC.FAIRMONT_EMAIL_ANALYSIS
-    """
-
 # Use the function to retrieve data
-df = get_dataframe(query)
+df = get_base("email_analysis")
+
+# The search box and table rerun on their own while typing
+@st.experimental_fragment
+def search_table(df):
+    # Display the search input
+    st.markdown("## 🔍 Search the Table")
+    search_input = st.text_input("Type to search the table", "")
 
-# Display the search input
-st.markdown("## 🔍 Search the Table")
-search_input = st.text_input("Type to search the table", "")
+    # Filter the dataframe based on the search input
+    if search_input:
+        df = df[df.apply(lambda row: row.astype(str).str.contains(search_input, case=False).any(), axis=1)]
 
-# Filter the dataframe based on the search input
-if search_input:
-    df = df[df.apply(lambda row: row.astype(str).str.contains(search_input, case=False).any(), axis=1)]
+    # Display the table result
+    if df is not None:
+        st.markdown("## 📊 Table Result")
+        paged_dataframe(df, key="email_analysis_rows")
 
-# Display the table result
-if df is not None:
-    st.markdown("## 📊 Table Result")
-    st.dataframe(df, height=600, width=None)
+search_table(df)
 
 # Button to link to external Google Sheet
 st.markdown("## 📄 External Resources")